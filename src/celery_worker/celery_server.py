@@ -5,13 +5,14 @@ Celery 服务配置与核心模块
 1. 初始化 Celery 应用实例 (`celery_app`)，供生产者和消费者共同使用。
 2. 配置 Celery 的各项参数，包括 Broker、Backend、序列化方式、时区、并发控制等。
 3. 提供队列管理相关的工具函数，如查询队列长度 (`get_queue_length`)、选择负载最小的队列 (`choose_queue_by_least_backlog`)。
-4. 提供统一的任务发送接口 (`send_pdf_task`)，屏蔽底层任务名称细节。
+4. 提供统一的任务发送接口 (`send_pdf_task` / `send_pdf_tasks_bulk`)，屏蔽底层任务名称细节。
 
 使用说明：
 - 生产者（如 API 服务）：引用本模块的 `celery_app` 或 `send_pdf_task` 来分发任务。
 - 消费者（Worker）：启动时加载本模块作为 Celery 的入口（app）。
 """
 from celery import Celery
+from kombu.exceptions import OperationalError
 import os
 from data.redis.redis_client import RedisClient
 from utils.logging import setup_logger
@@ -123,3 +124,21 @@ def send_pdf_task(task_id: str, queue: str) -> None:
     通过任务名进行派发，避免在生产者侧导入沉重的 worker 模块。
     """
     celery_app.send_task(TASK_NAME_PROCESS_PDF, args=[task_id], queue=queue)
+
+def send_pdf_tasks_bulk(task_ids: list[str], queue: str) -> list[str]:
+    """
+    批量派发任务：所有消息共用从 producer 池中取出的同一个 producer（同一条 broker 连接），避免每个任务各自获取连接。
+    broker 连接出错时停止派发，不再为剩余任务逐个重试连接。
+    :return: 已成功派发的任务ID列表（按传入顺序的前缀）
+    """
+    sent: list[str] = []
+    if not task_ids:
+        return sent
+    try:
+        with celery_app.producer_pool.acquire(block=True) as producer:
+            for task_id in task_ids:
+                celery_app.send_task(TASK_NAME_PROCESS_PDF, args=[task_id], queue=queue, producer=producer)
+                sent.append(task_id)
+    except (OperationalError, ConnectionError) as e:
+        logger.error(f"批量派发任务中断: 已派发 {len(sent)}/{len(task_ids)}，队列: {queue}，异常: {e}")
+    return sent
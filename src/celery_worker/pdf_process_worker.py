@@ -147,12 +147,17 @@ if __name__ == "__main__":
     devices = _parse_inference_devices()
     if not devices:
         devices = [None]  # CPU 回退
+    # 每个设备一个 Worker 进程，OpenMP/MKL 线程池默认按进程数均分 CPU，避免多个进程各自拉起 cpu_count 个线程互相争抢
+    # 通过子进程的环境变量传入，在其导入 NumPy/torch 之前生效；已在环境中显式配置的值不覆盖
+    native_threads = str(max(1, (os.cpu_count() or 1) // len(devices)))
     
     procs = []
     for idx, d in enumerate(devices):
         env = os.environ.copy()
         # 允许以 root 用户运行 Celery（在容器环境中常见）
         env["C_FORCE_ROOT"] = "1"
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            env.setdefault(var, native_threads)
         q = os.getenv("WORKER_QUEUE_NAME", DEFAULT_QUEUE_NAME)
         env["WORKER_QUEUE_NAME"] = q
         base_endpoint = os.getenv("VLLM_BASE_ENDPOINT", "localhost")
@@ -1,8 +1,9 @@
 # 预定义的文件类型
-PDF_EXTENSIONS = [".pdf"]
-OFFICE_EXTENSIONS = [".ppt", ".pptx", ".doc", ".docx"]
-IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg"]
-WORD_EXTENTIONS = [".docx", ".doc"]
-PPT_EXTENTIONS = [".ppt", ".pptx"]
-EXCEL_EXTENTIONS = [".xlsx",".xls",".csv"]
-PLAIN_TEXT_EXTENSIONS = [".txt"]
+# 使用小写的 frozenset，成员判断为 O(1)；调用方需先将扩展名转为小写再判断
+PDF_EXTENSIONS = frozenset({".pdf"})
+OFFICE_EXTENSIONS = frozenset({".ppt", ".pptx", ".doc", ".docx"})
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg"})
+WORD_EXTENTIONS = frozenset({".docx", ".doc"})
+PPT_EXTENTIONS = frozenset({".ppt", ".pptx"})
+EXCEL_EXTENTIONS = frozenset({".xlsx", ".xls", ".csv"})
+PLAIN_TEXT_EXTENSIONS = frozenset({".txt"})
@@ -15,7 +15,8 @@ Key Features:
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 from data.model import Task
-from typing import Optional, TypeVar
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, TypeVar
 from data.model import Base # 引入Base模型类
 from const.task_status_enum import TaskStatus
 from fastapi import HTTPException
@@ -83,6 +84,49 @@ class TaskRepository:
         finally:
             db.close()
 
+    @log_with_time_consumption(level = "INFO")
+    def create_tasks(self, tasks: List[Task]) -> List[Task]:
+        '''
+        批量创建任务，一个事务内写入
+        提交后不过期对象属性，调用方无需逐个 refresh 即可继续读取
+        '''
+        db = self.SessionLocal(expire_on_commit=False)
+        try:
+            db.add_all(tasks)
+            db.commit()
+            return tasks
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+
+    def fail_tasks(self, task_ids: Iterable[str]) -> int:
+        '''
+        将一批任务标记为失败（如派发到队列失败的任务），一条 UPDATE 完成
+        :param: task_ids: 任务ID列表
+        :return: 更新的行数
+        '''
+        task_ids = list(set(task_ids))
+        if not task_ids:
+            return 0
+        db = self.SessionLocal()
+        try:
+            updated = (
+                db.query(Task)
+                .filter(Task.task_id.in_(task_ids))
+                .update(
+                    {Task.status: TaskStatus.FAILED, Task.finish_time: datetime.now()},
+                    synchronize_session=False
+                )
+            )
+            db.commit()
+            return updated
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
 
     def get_task_by_id(self, task_id: str) -> Task:
         '''
@@ -94,6 +138,22 @@ class TaskRepository:
         finally:
             db.close()
 
+    def get_tasks_by_ids(self, task_ids: Iterable[str]) -> Dict[str, Task]:
+        '''
+        按任务ID批量获取任务，一次 IN 查询代替逐个查询
+        :param: task_ids: 任务ID列表
+        :return: task_id -> Task 的字典，不存在的任务不出现在结果中
+        '''
+        task_ids = list(set(task_ids))
+        if not task_ids:
+            return {}
+        db = self.SessionLocal()
+        try:
+            tasks = db.query(Task).filter(Task.task_id.in_(task_ids)).all()
+            return {task.task_id: task for task in tasks}
+        finally:
+            db.close()
+
     @log_with_time_consumption(level = "INFO")
     def update_task(self, task: Task) -> Task:
         '''
@@ -143,7 +203,6 @@ class TaskRepository:
         '''
         完成当前任务，并返回队列中最早的待处理任务
         '''
-        from datetime import datetime
         db = self.SessionLocal()
         try:
             # 完成当前任务
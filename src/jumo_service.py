@@ -5,6 +5,11 @@ if __name__ == "__main__":
     # 就是防止新创建的子进程重复加载配置项
     import os
     os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
+    # API 进程的并发来自请求与线程池，NumPy/MKL 等库的 OpenMP 线程池默认限制为单线程，避免 线程数 × OMP 线程数 超订 CPU
+    # 必须在这些库首次导入之前设置；已在环境中显式配置的值不覆盖
+    # NER 的 torch 推理线程数由 NER_NUM_THREADS 通过 torch.set_num_threads 单独设置，不受这里影响
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
     from loguru import logger
     from startup import *
     import uvicorn
@@ -12,7 +17,14 @@ if __name__ == "__main__":
     from route.documents_route import router as documents_router
     from route.content_searching_route import router as content_searching_router
     from fastapi import FastAPI
-    app = FastAPI() # 启动服务
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    try:
+        import orjson  # noqa: F401
+        # orjson 为 C 扩展，序列化更快且直接输出 bytes；StreamingResponse 等显式返回的响应不受影响
+        default_response_class = ORJSONResponse
+    except ImportError:
+        default_response_class = JSONResponse
+    app = FastAPI(default_response_class=default_response_class) # 启动服务
     app.include_router(pdf_router)
     app.include_router(documents_router)
     app.include_router(content_searching_router)
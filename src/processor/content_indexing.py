@@ -15,13 +15,14 @@
 
 2.  **DocumentIndex**:
     -   表示完整文档的内存索引。
-    -   提供 `search` 方法以查找所有页面中的关键字出现位置。
+    -   构建字符 bigram 倒排索引，`search` 先按倒排列表求交得到候选段落，再在候选段落中定位关键字。
     -   可以序列化/反序列化以进行缓存。
 
 3.  **DocumentIndexService**:
     -   编排文档索引的生命周期。
     -   `load_document_index_from_oss`: 从 MinIO 下载 `middle.json`，将其解析为 `DocumentIndex`，并将其缓存到 Redis（Pickle 序列化）。
-    -   `search_keyword_in_document`: 从 Redis 检索索引并执行搜索。
+    -   `search_keyword`: 优先使用进程内（LRU）索引，未命中时从 Redis 检索，再执行搜索；失败时抛出异常。
+    -   `search_keyword_in_document`: 同上，失败时返回空列表。
 
 工作流程:
 ---------
@@ -37,6 +38,9 @@ import pickle
 import os
 import tempfile
 import base64
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
 from data.redis.cache_service import CacheService
 from utils.minio_tool import MinioConnection
 
@@ -182,6 +186,56 @@ class ParaBlockInfo:
 class DocumentIndex:
     def __init__(self, pages: Dict[int, List[ParaBlockInfo]]):
         self.pages: Dict[int, List[ParaBlockInfo]] = pages
+        self._build_inverted_index()
+
+    def _build_inverted_index(self) -> None:
+        """
+        建立字符二元组倒排索引：bigram -> 包含该 bigram 的段落编号（升序）
+        段落按 pages 的遍历顺序编号，保证候选段落的顺序与全量扫描一致
+        """
+        self.blocks: List[ParaBlockInfo] = [pb for blocks in self.pages.values() for pb in blocks]
+        postings: Dict[str, List[int]] = {}
+        for block_id, pb in enumerate(self.blocks):
+            text = pb.text
+            for gram in {text[i:i + 2] for i in range(len(text) - 1)}:
+                postings.setdefault(gram, []).append(block_id)
+        self.postings = postings
+
+    @staticmethod
+    def _intersect_postings(posting_lists: List[List[int]]) -> List[int]:
+        """
+        有序倒排列表求交：从最短的列表出发，在其余列表中用二分跳跃查找
+        """
+        posting_lists = sorted(posting_lists, key=len)
+        result = posting_lists[0]
+        for other in posting_lists[1:]:
+            merged = []
+            lo = 0
+            for block_id in result:
+                lo = bisect_left(other, block_id, lo)
+                if lo == len(other):
+                    break
+                if other[lo] == block_id:
+                    merged.append(block_id)
+            result = merged
+            if not result:
+                break
+        return result
+
+    def _candidate_blocks(self, keyword: str) -> List[ParaBlockInfo]:
+        # 兼容 Redis 中未带倒排索引的旧对象
+        if getattr(self, "postings", None) is None:
+            self._build_inverted_index()
+        # 单字符或空关键词无法用 bigram 过滤，退回全量扫描
+        if len(keyword) < 2:
+            return self.blocks
+        posting_lists = []
+        for gram in {keyword[i:i + 2] for i in range(len(keyword) - 1)}:
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            posting_lists.append(posting)
+        return [self.blocks[block_id] for block_id in self._intersect_postings(posting_lists)]
     
     @staticmethod
     def from_middle_json(middle_json: Dict) -> "DocumentIndex":
@@ -209,16 +263,55 @@ class DocumentIndex:
 
     def search(self, keyword: str) -> List[Dict]:
         results = []
-        for blocks in self.pages.values():
-            for pb in blocks:
-                if keyword in pb.text:
-                    results.extend(pb.find_keyword(keyword))
+        # 倒排索引只做候选过滤，命中与否仍以子串匹配为准
+        for pb in self._candidate_blocks(keyword):
+            if keyword in pb.text:
+                results.extend(pb.find_keyword(keyword))
         return results
 
+# 进程内常驻的文档索引数量上限，超出后按 LRU 淘汰
+DOCUMENT_INDEX_CACHE_SIZE = int(os.getenv("DOCUMENT_INDEX_CACHE_SIZE", "32"))
+
+
 class DocumentIndexService:
     def __init__(self):
         self.cache_service = CacheService()
         self.minio_client = MinioConnection()
+        # task_id -> DocumentIndex，避免每次搜索都从 Redis 取出并反序列化
+        self._indexes: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+        self._indexes_lock = threading.Lock()
+
+    def _remember_index(self, task_id: str, document_index: DocumentIndex) -> None:
+        with self._indexes_lock:
+            self._indexes[task_id] = document_index
+            self._indexes.move_to_end(task_id)
+            while len(self._indexes) > DOCUMENT_INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+
+    def _get_index(self, task_id: str) -> DocumentIndex:
+        with self._indexes_lock:
+            document_index = self._indexes.get(task_id)
+            if document_index is not None:
+                self._indexes.move_to_end(task_id)
+                return document_index
+
+        # 从Redis获取序列化的DocumentIndex对象
+        redis_key = f"document_index:{task_id}"
+        serialized_data = self.cache_service.get(redis_key)
+
+        if serialized_data is None:
+            raise ValueError(f"No document index found for task {task_id}")
+
+        # 反序列化DocumentIndex对象
+        # 兼容旧数据：尝试先base64解码，如果失败则假设是旧数据直接反序列化
+        try:
+            decoded_data = base64.b64decode(serialized_data)
+            document_index: DocumentIndex = pickle.loads(decoded_data)
+        except Exception:
+            document_index: DocumentIndex = pickle.loads(serialized_data)
+
+        self._remember_index(task_id, document_index)
+        return document_index
 
     def _find_middle_json_file(self, task_id: str, bucket_name: str) -> str:
         """
@@ -272,6 +365,7 @@ class DocumentIndexService:
             serialized_data = base64.b64encode(pickle.dumps(document_index))
             redis_key = f"document_index:{task_id}"
             self.cache_service.set(redis_key, serialized_data)
+            self._remember_index(task_id, document_index)
             
             # 清理临时文件
             os.unlink(temp_path)
@@ -282,34 +376,27 @@ class DocumentIndexService:
             print(f"Error loading document index from OSS: {e}")
             return False
 
+    def search_keyword(self, task_id: str, keyword: str) -> List[Dict]:
+        """
+        从Redis中获取DocumentIndex对象并搜索关键词，索引不存在或 Redis 访问失败时抛出异常
+        :param task_id: 任务ID
+        :param keyword: 要搜索的关键词
+        :return: 搜索结果列表
+        """
+        # 优先使用进程内索引，未命中时从Redis加载
+        document_index = self._get_index(task_id)
+        # 搜索关键词
+        return document_index.search(keyword)
+
     def search_keyword_in_document(self, task_id: str, keyword: str) -> List[Dict]:
         """
         从Redis中获取DocumentIndex对象并搜索关键词
         :param task_id: 任务ID
         :param keyword: 要搜索的关键词
-        :return: 搜索结果列表
+        :return: 搜索结果列表，出错时返回空列表
         """
         try:
-            # 从Redis获取序列化的DocumentIndex对象
-            redis_key = f"document_index:{task_id}"
-            serialized_data = self.cache_service.get(redis_key)
-            
-            if serialized_data is None:
-                raise ValueError(f"No document index found for task {task_id}")
-            
-            # 反序列化DocumentIndex对象
-            # 兼容旧数据：尝试先base64解码，如果失败则假设是旧数据直接反序列化
-            try:
-                decoded_data = base64.b64decode(serialized_data)
-                document_index: DocumentIndex = pickle.loads(decoded_data)
-            except Exception:
-                document_index: DocumentIndex = pickle.loads(serialized_data)
-            
-            # 搜索关键词
-            results = document_index.search(keyword)
-            
-            return results
-            
+            return self.search_keyword(task_id, keyword)
         except Exception as e:
             print(f"Error searching keyword in document: {e}")
             return []
\ No newline at end of file
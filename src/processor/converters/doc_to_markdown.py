@@ -19,6 +19,7 @@ from docling.datamodel.pipeline_options import PaginatedPipelineOptions
 from docling.document_converter import WordFormatOption
 import os
 import re
+import threading
 from startup import minio_tool
 from PIL import Image
 from docling_core.transforms.serializer.markdown import MarkdownDocSerializer
@@ -28,6 +29,11 @@ from docling_core.types.doc.document import DOCUMENT_TOKENS_EXPORT_LABELS
 转换word文档为markdown格式(基于docling实现)
 """
 
+# 进程内同时进行的文档转换数量上限，所有调用 doc_to_markdown 的路由共用
+# 转换过程占用大量 CPU 和内存，并发过多反而降低整体吞吐甚至触发 OOM
+MAX_CONVERSIONS = int(os.getenv("MAX_CONVERSIONS", max(1, (os.cpu_count() or 2) // 2)))
+_conversion_sem = threading.BoundedSemaphore(MAX_CONVERSIONS)
+
 def doc_to_markdown(
     input_data : str,
     task_id:str = "no_specific_task_id",
@@ -53,8 +59,9 @@ def doc_to_markdown(
             InputFormat.DOCX: WordFormatOption(pipeline_options=docx_pipeline_options),
         }
     )
-    # 转换文档为 DoclingDocument对象
-    result = converter.convert(input_data)
+    # 转换文档为 DoclingDocument对象，超出并发上限时在此排队
+    with _conversion_sem:
+        result = converter.convert(input_data)
     # 对result.document进行处理,去除目录信息
     # 然后输出为markdown格式
     processed_doc = result.document
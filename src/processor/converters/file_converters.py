@@ -9,14 +9,96 @@ before further processing.
 Dependencies:
 -------------
 -   **LibreOffice (`soffice`)**: Must be installed and available in the system PATH.
+-   **unoserver** (optional): When `UNOSERVER_PORT` is set, conversions are sent to a long-running
+    unoserver daemon through `unoconvert` instead of starting a new `soffice` process per file.
+-   **img2pdf** (optional): Wraps JPEG/PNG streams into a PDF without re-encoding; falls back to PIL if missing.
 """
+import io
+import os
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 
+from loguru import logger
+from PIL import Image
+
+try:
+    import img2pdf
+    _HAS_IMG2PDF = True
+except ImportError:
+    _HAS_IMG2PDF = False
+
+# 常驻 unoserver 的地址，未配置端口时每次转换启动一个 soffice 进程
+UNOSERVER_HOST = os.getenv("UNOSERVER_HOST", "127.0.0.1")
+UNOSERVER_PORT = os.getenv("UNOSERVER_PORT")
+# 同时进行的 Office 转换数量上限
+OFFICE_CONVERT_CONCURRENCY = int(os.getenv("OFFICE_CONVERT_CONCURRENCY", os.getenv("MAX_WORKERS", "8")))
+_convert_semaphore = threading.BoundedSemaphore(OFFICE_CONVERT_CONCURRENCY)
+
+
+def _convert_office_bytes(file_bytes: bytes, suffix: str, target: str) -> bytes:
+    """
+    将 Office 文件字节流转换为 target 格式（如 pdf、docx）
+    配置了 UNOSERVER_PORT 时通过 unoconvert 经标准输入输出与常驻的 unoserver 交互，省去 soffice 冷启动；
+    否则在临时目录中调用 soffice 完成转换，每次转换使用临时目录下独立的用户配置目录：
+    多个 soffice 共用默认配置时会因配置锁把任务转交给先启动的实例或直接退出，不产生输出文件
+    """
+    with _convert_semaphore:
+        if UNOSERVER_PORT:
+            return subprocess.run([
+                "unoconvert",
+                "--host", UNOSERVER_HOST,
+                "--port", UNOSERVER_PORT,
+                "--convert-to", target,
+                "-", "-"
+            ], input=file_bytes, stdout=subprocess.PIPE, check=True).stdout
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir_path = Path(tmpdir)
+            input_path = tmpdir_path / f"input{suffix}"
+            output_path = tmpdir_path / f"input.{target}"
+            input_path.write_bytes(file_bytes)
+            subprocess.run([
+                "soffice",
+                f"-env:UserInstallation={(tmpdir_path / 'lo_profile').as_uri()}",
+                "--headless",
+                "--convert-to", target,
+                str(input_path),
+                "--outdir", str(tmpdir_path)
+            ], check=True)
+            return output_path.read_bytes()
+
+
+def image_bytes_to_pdf_bytes(image_bytes: bytes) -> bytes:
+    """将图片字节流转换为单页PDF字节流。
+       优先使用 img2pdf 直接把原始 JPEG/PNG 数据流嵌入 PDF，不做解码和重新编码；
+       img2pdf 不可用或无法处理（如带透明通道的 PNG）时回退到 PIL 转 RGB 后写出 PDF
+    参数:
+        image_bytes: 图片文件的字节流。
+
+    返回:
+        PDF文件的字节流。
+    """
+    if _HAS_IMG2PDF:
+        try:
+            return img2pdf.convert(image_bytes)
+        except Exception as e:
+            logger.debug(f"img2pdf 无法直接转换，回退到 PIL: {e}")
+
+    pdf_buffer = io.BytesIO()
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        # 已是 RGB 的图片无需再 convert 复制一份像素数据
+        rgb_image = image if image.mode == "RGB" else image.convert("RGB")
+        rgb_image.save(pdf_buffer, format="PDF")
+        del rgb_image
+    # 缓冲区未被导出时 getvalue() 直接复用内部 bytes，不会额外复制
+    return pdf_buffer.getvalue()
+
+
 def office_bytes_to_pdf_bytes(word_bytes: bytes, suffix:str=".docx") -> bytes:
     """将Word文件字节流转换为PDF字节流。
-       启动一个子进程，调用libreoffice进行转换
+       调用libreoffice进行转换（常驻的 unoserver 或单独启动的 soffice 子进程）
     参数:
         word_bytes: Word文件的字节流。
         suffix: 文件后缀（.docx或.doc），用于保存临时文件。
@@ -24,39 +106,9 @@ def office_bytes_to_pdf_bytes(word_bytes: bytes, suffix:str=".docx") -> bytes:
     返回:
         PDF文件的字节流。
     """
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmpdir_path = Path(tmpdir)
-        input_path = tmpdir_path / f"input{suffix}"
-        output_path = tmpdir_path / "input.pdf"
-
-        # 写入临时Word文件
-        input_path.write_bytes(word_bytes)
-
-        # 执行LibreOffice命令转换为PDF
-        subprocess.run([
-            "soffice",
-            "--headless",
-            "--convert-to", "pdf",
-            str(input_path),
-            "--outdir", str(tmpdir_path)
-        ], check=True)
-
-        # 读取并返回PDF字节流
-        return output_path.read_bytes()
+    return _convert_office_bytes(word_bytes, suffix, "pdf")
 
 
 def office_bytes_to_docx_bytes(word_bytes: bytes, suffix: str = ".doc") -> bytes:
     """将旧版 Word (.doc) 字节流转换为 .docx 字节流，便于后续 markdown 处理"""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmpdir_path = Path(tmpdir)
-        input_path = tmpdir_path / f"input{suffix}"
-        output_path = tmpdir_path / "input.docx"
-        input_path.write_bytes(word_bytes)
-        subprocess.run([
-            "soffice",
-            "--headless",
-            "--convert-to", "docx",
-            str(input_path),
-            "--outdir", str(tmpdir_path)
-        ], check=True)
-        return output_path.read_bytes()
\ No newline at end of file
+    return _convert_office_bytes(word_bytes, suffix, "docx")
\ No newline at end of file
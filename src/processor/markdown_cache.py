@@ -0,0 +1,53 @@
+"""
+Markdown 转换结果缓存
+=====================
+
+按源文件内容摘要缓存 Office 文件转换出的 Markdown，同一份文件以不同对象名重复入库时跳过转换。
+
+-   摘要在从 MinIO 流式下载源文件时顺带计算（blake2b，16 字节），不额外读取文件。
+-   缓存对象存放在输出桶的 `MARKDOWN_CACHE_PREFIX/` 下。
+-   影响转换结果的参数（如切分长度）需要作为 `params` 一并计入缓存键。
+    Word 文档提取的图片上传在以任务号命名的目录下，Markdown 中的图片链接包含该目录，
+    因此 Word 的缓存键还要包含图片目录，否则会复用到指向其他文档图片的 Markdown。
+-   写入缓存以及命中后复制到目标位置，都通过 `MinioConnection.copy_file` 在服务端完成。
+"""
+import hashlib
+import os
+
+from loguru import logger
+
+from utils.minio_tool import MinioConnection
+
+# 缓存对象在输出桶中的前缀
+MARKDOWN_CACHE_PREFIX = os.getenv("MARKDOWN_CACHE_PREFIX", "markdown_cache")
+
+
+def new_content_hasher():
+    """
+    创建计算源文件摘要的 hasher，传给 MinioConnection.stream_to_file
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+def markdown_cache_object(hasher, *params) -> str:
+    """
+    根据内容摘要与转换参数生成缓存对象名
+    参数并入摘要而不是拼接到对象名中，参数中的 / 等字符不会影响对象路径
+    """
+    digest = hasher.copy()
+    for param in params:
+        digest.update(b"\0" + str(param).encode("utf-8"))
+    return f"{MARKDOWN_CACHE_PREFIX}/{digest.hexdigest()}.md"
+
+
+def has_cached_markdown(minio_tool: MinioConnection, bucket_name: str, cache_object: str) -> bool:
+    """
+    判断缓存是否存在，命中时由调用方通过 copy_file 复制缓存对象
+    """
+    try:
+        return minio_tool.file_exists(object_name=cache_object, bucket_name=bucket_name)
+    except Exception as e:
+        # 缓存不可用时按未命中处理，不影响正常转换
+        logger.warning(f"检查 Markdown 缓存失败: {cache_object}, 异常: {e}")
+        return False
+
@@ -45,7 +45,7 @@ from loguru import logger
 from utils.auto_device_selector import get_device
 from processor.converters.table_to_markdown import html_table_to_key_value
 from processor.nlp_inference.factory import InferenceFactory
-from .named_entity_recognition import append_entities_to_header  # 引入自动实体提取函数
+from .named_entity_recognition import append_entities_to_headers  # 引入批量实体提取函数
 
 
 # 确保 punkt_tab 可用
@@ -215,9 +215,39 @@ def split_text_by_length_and_newline(text: str, max_length: int) -> list[str]:
     return chunks
 
 
-def _flush_content(result, current_content, title_stack, max_length, special_element=None, allow_split=False) -> None:
+# 标题的实体增强是攒批进行的：先在 result 中占位，攒够一个窗口再统一推理并回填
+ENTITY_BATCH_WINDOW = 32
+
+def _resolve_entity_headers(result, pending_headers) -> None:
+    """
+    对积攒的 (result中的下标, 标题, 文本块) 批量提取实体，并把增强后的标题回填到 result 中
+    """
+    if not pending_headers:
+        return
+    headers = append_entities_to_headers([(header, chunk) for _, header, chunk in pending_headers])
+    for (index, _, _), header in zip(pending_headers, headers):
+        result[index] = header
+    pending_headers.clear()
+
+
+def _defer_entity_header(result, pending_headers, header, chunk) -> None:
+    """
+    在 result 中为标题占位，并登记到待处理队列，队列满一个窗口时立即批量处理
+    """
+    pending_headers.append((len(result), header, chunk))
+    result.append(header)
+    if len(pending_headers) >= ENTITY_BATCH_WINDOW:
+        _resolve_entity_headers(result, pending_headers)
+
+
+def _flush_content(result, current_content, title_stack, max_length, special_element=None, allow_split=False,
+                   pending_headers=None) -> None:
     if not current_content:
         return
+    # 未提供攒批队列时，在本次调用结束前就地处理
+    resolve_now = pending_headers is None
+    if resolve_now:
+        pending_headers = []
     content = '\n'.join(current_content).strip()
     if not content:
         current_content.clear()
@@ -241,8 +271,8 @@ def _flush_content(result, current_content, title_stack, max_length, special_ele
                     header = f"{base_header}|{special_element}|Part {idx}"
                 else:
                     header = f"{base_header}|Part {idx}"
-                header = append_entities_to_header(header, chunk)
-                result.extend([header, chunk, '-' * 10])
+                _defer_entity_header(result, pending_headers, header, chunk)
+                result.extend([chunk, '-' * 10])
         else:
             base_header = f"{'#' * level} {title_path}" if title_path else f"{'#' * level}"
             if special_element:
@@ -250,13 +280,12 @@ def _flush_content(result, current_content, title_stack, max_length, special_ele
             else:
                 header = base_header
             
-            header = append_entities_to_header(header, content)
-            
-            if header:
-                result.append(header)
-                result.append("")
+            _defer_entity_header(result, pending_headers, header, content)
+            result.append("")
             result.extend([content, '-' * 10])
     current_content.clear()
+    if resolve_now:
+        _resolve_entity_headers(result, pending_headers)
 
 
 def _extract_table_block(tokens, i, original_lines):
@@ -300,12 +329,13 @@ def process_markdown(md_text: str, max_length: int = 500) -> str:
     result = []
     current_content = []
     title_stack = [''] * 6
+    pending_headers = []  # 待批量提取实体的标题
 
     i = 0
     while i < len(tokens):
         token = tokens[i]
         if token.type == 'heading_open':
-            _flush_content(result, current_content, title_stack, max_length)
+            _flush_content(result, current_content, title_stack, max_length, pending_headers=pending_headers)
             inline_token = tokens[i + 1]
             if inline_token.type == 'inline':
                 full_title = inline_token.content.strip()
@@ -316,10 +346,10 @@ def process_markdown(md_text: str, max_length: int = 500) -> str:
             i += 3
             continue
         elif token.type == 'table_open':
-            _flush_content(result, current_content, title_stack, max_length)
+            _flush_content(result, current_content, title_stack, max_length, pending_headers=pending_headers)
             j, table_content = _extract_table_block(tokens, i, original_lines)
             current_content.append(table_content)
-            _flush_content(result, current_content, title_stack, max_length, special_element='Table')
+            _flush_content(result, current_content, title_stack, max_length, special_element='Table', pending_headers=pending_headers)
             i = j + 1 if j < len(tokens) else len(tokens)
             continue
         elif token.type == 'paragraph_open':
@@ -333,7 +363,7 @@ def process_markdown(md_text: str, max_length: int = 500) -> str:
             i += 1
             continue
         elif token.type == 'ordered_list_open':
-            _flush_content(result, current_content, title_stack, max_length)
+            _flush_content(result, current_content, title_stack, max_length, pending_headers=pending_headers)
             list_content = []
             j = i + 1
             list_item_counter = 1
@@ -348,11 +378,11 @@ def process_markdown(md_text: str, max_length: int = 500) -> str:
                 j += 1
             if list_content:
                 current_content.extend(list_content)
-                _flush_content(result, current_content, title_stack, max_length, special_element=token.type)
+                _flush_content(result, current_content, title_stack, max_length, special_element=token.type, pending_headers=pending_headers)
             i = j + 1
             continue
         elif token.type == 'bullet_list_open':
-            _flush_content(result, current_content, title_stack, max_length)
+            _flush_content(result, current_content, title_stack, max_length, pending_headers=pending_headers)
             list_content = []
             j = i + 1
             while j < len(tokens) and tokens[j].type != 'bullet_list_close':
@@ -365,11 +395,11 @@ def process_markdown(md_text: str, max_length: int = 500) -> str:
                 j += 1
             if list_content:
                 current_content.extend(list_content)
-                _flush_content(result, current_content, title_stack, max_length, special_element=token.type)
+                _flush_content(result, current_content, title_stack, max_length, special_element=token.type, pending_headers=pending_headers)
             i = j + 1
             continue
         elif token.type == 'html_block':
-            _flush_content(result, current_content, title_stack, max_length)
+            _flush_content(result, current_content, title_stack, max_length, pending_headers=pending_headers)
             content = token.content.strip()
             # 尝试检测是否为表格，并转换为KV格式
             # 如果转换成功，则将其标记为Table KV，并允许后续按行切分
@@ -389,18 +419,18 @@ def process_markdown(md_text: str, max_length: int = 500) -> str:
             # 在这里把表格内容按行做切分，以防表格内容过长
 
             if is_converted_table:
-                _flush_content(result, current_content, title_stack, max_length, special_element='Table KV', allow_split=True)
+                _flush_content(result, current_content, title_stack, max_length, special_element='Table KV', allow_split=True, pending_headers=pending_headers)
             else:
-                _flush_content(result, current_content, title_stack, max_length, special_element=token.type)
+                _flush_content(result, current_content, title_stack, max_length, special_element=token.type, pending_headers=pending_headers)
             i += 1
             continue
         elif token.type in ['list_item_close', 'ordered_list_close', 'bullet_list_close', 'list_item_open']:
             i += 1
             continue
         elif token.type == 'math_block':
-            _flush_content(result, current_content, title_stack, max_length)
+            _flush_content(result, current_content, title_stack, max_length, pending_headers=pending_headers)
             current_content.append(f"$ {token.content} $")
-            _flush_content(result, current_content, title_stack, max_length, special_element='Math Block')
+            _flush_content(result, current_content, title_stack, max_length, special_element='Math Block', pending_headers=pending_headers)
             i += 1
             continue
         else:
@@ -408,7 +438,8 @@ def process_markdown(md_text: str, max_length: int = 500) -> str:
             i += 1
 
     # 循环结束后，将剩余的内容写入结果
-    _flush_content(result, current_content, title_stack, max_length)
+    _flush_content(result, current_content, title_stack, max_length, pending_headers=pending_headers)
+    _resolve_entity_headers(result, pending_headers)
 
     if result and result[-1] == '-' * 10:
         result.pop()
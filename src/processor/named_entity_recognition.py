@@ -35,11 +35,17 @@ The primary entry point is `extract_entities_auto(text)`.
 """
 import os
 os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
+import re
+import bisect
 import threading
+import heapq
 from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
 import torch
+from torch.utils.data import Dataset
 from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from loguru import logger
 from utils.auto_device_selector import get_device
 from utils.singleton import parameterized_singleton
@@ -47,9 +53,55 @@ from transformers.pipelines import Pipeline
 from transformers.modeling_utils import PreTrainedModel
 from transformers.tokenization_utils_base import PreTrainedTokenizerBase
 
+# 小模型推理超过4个线程收益递减，反而会和其他线程互相争抢CPU
+NER_NUM_THREADS = int(os.getenv("NER_NUM_THREADS", min(4, os.cpu_count() or 1)))
+# torch 的算子线程数是进程级设置，本模块也会被 Celery worker 间接导入，
+# 因此只在 NER 推理期间切换为 NER_NUM_THREADS，结束后恢复，不影响同进程中的 MinerU 等模型
+_ner_threads_lock = threading.Lock()
+_ner_threads_users = 0
+_saved_num_threads = None
+
+
+@contextmanager
+def _ner_intra_op_threads():
+    """
+    NER 推理期间使用 NER_NUM_THREADS 个算子线程；多个线程同时推理时由第一个进入者设置、最后一个退出者恢复
+    """
+    global _ner_threads_users, _saved_num_threads
+    with _ner_threads_lock:
+        if _ner_threads_users == 0:
+            _saved_num_threads = torch.get_num_threads()
+            torch.set_num_threads(NER_NUM_THREADS)
+        _ner_threads_users += 1
+    try:
+        yield
+    finally:
+        with _ner_threads_lock:
+            _ner_threads_users -= 1
+            if _ner_threads_users == 0:
+                torch.set_num_threads(_saved_num_threads)
+
 # 预设好NER模型的名称
 MODEL_NAME = "uer/roberta-base-finetuned-cluener2020-chinese"
 ENGLISH_MODEL_NAME = "dslim/bert-base-NER"#"elastic/distilbert-base-cased-finetuned-conll03-english"
+# 批量推理时每个前向批次的大小
+NER_BATCH_SIZE = 32
+
+
+class _TextDataset(Dataset):
+    """
+    将文本列表包装为 Dataset，使 pipeline 以流式方式处理：
+    分词与数据搬运在迭代过程中预取，和模型前向推理重叠进行
+    """
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index: int) -> str:
+        return self.texts[index]
+
 # region
 class Entity:
     """
@@ -113,7 +165,7 @@ class Entity:
         Returns:
             bool: 如果包含中文字符返回True，否则返回False
         """
-        return any('\u4e00' <= char <= '\u9fff' for char in text)
+        return _is_chinese_text(text)
     
     def _get_standard_type(self, entity_group: str) -> str:
         """
@@ -317,11 +369,87 @@ class SingletonNERModel:
             logger.error(f"加载NER模型失败: {e}")
             raise
     
+    @staticmethod
+    def _truncate_text(text: str) -> str:
+        """
+        检查文本长度并进行截断
+        这里虽然不能严格对应实际的512 tokens的长度
+        但是可以应付绝大部分场景
+        如果使用基于tokens的滑动窗口就有点复杂了
+        现在 simply,lovely
+        """
+        max_length = 500  # 保守的最大长度，确保分词后不超过512
+        if len(text) > max_length:
+            logger.warning(f"输入文本长度 {len(text)} 超过最大长度 {max_length}，将进行截断")
+            return text[:max_length]
+        if len(text) < 10:
+            logger.warning(f"输入文本长度 {len(text)} 过短，可能影响识别效果")
+        return text
+
+    @staticmethod
+    def _postprocess_entities(original_text: str,
+                              raw_entities: List[Dict[str, Any]],
+                              confidence_threshold: float,
+                              return_objects: bool,
+                              entity_num: int,
+                              contains_chinese: Optional[bool]) -> List[Any]:
+        """
+        对 pipeline 的原始输出做过滤、重建、去重，并截取置信度最高的 entity_num 个实体
+        """
+        # 过滤低置信度的实体
+        filtered_entities = [
+            entity for entity in raw_entities 
+            if entity.get('score', 0) >= confidence_threshold
+        ]
+
+        # 只取置信度最高的若干候选（流式 top-k），无需对全部实体排序
+        # 多取几倍是为了给后面的去重留出余量
+        top_entities = heapq.nlargest(
+            entity_num * 3, filtered_entities, key=lambda e: e.get('score', 0)
+        )
+        
+        # 使用有序集合去重并保留置信度最高的实体
+        unique_entities = OrderedDict()
+        word_bounds = _compute_word_bounds(original_text) if top_entities else None
+        for entity_data in top_entities:
+            # 使用独立函数重建更友好的实体文本与词边界
+            # 避免出现识别出来的实体是一个被拆出来的子词（比如kagawa被识别成了#gawa）
+            clean_text, left, right = _reconstruct_entity_text_and_bounds(
+                original_text, entity_data, contains_chinese, word_bounds
+            )
+            entity_group = entity_data.get('entity_group', 'UNKNOWN')
+            entity_key = (entity_group, clean_text)
+            if entity_key in unique_entities:
+                continue
+
+            # 创建Entity对象或字典
+            if return_objects:
+                unique_entities[entity_key] = Entity(
+                    entity_group=entity_group,
+                    entity_text=clean_text,
+                    score=round(entity_data.get('score', 0), 4),
+                    start=left,
+                    end=right
+                )
+            else:
+                unique_entities[entity_key] = {
+                    'entity_group': entity_group,
+                    'entity': clean_text,
+                    'score': round(entity_data.get('score', 0), 4),
+                    'start': left,
+                    'end': right
+                }
+            if len(unique_entities) >= entity_num:
+                break
+
+        return list(unique_entities.values())
+
     def extract_entities(self, 
                         text: str, 
                         confidence_threshold: float = 0.7, 
                         return_objects: bool = False, 
-                        entity_num: int = 5
+                        entity_num: int = 5,
+                        contains_chinese: Optional[bool] = None
     ) -> List[Dict[str, Any]]:
         """
         从文本中提取命名实体
@@ -331,6 +459,7 @@ class SingletonNERModel:
             confidence_threshold (float): 置信度阈值，默认0.5
             return_objects (bool): 是否返回Entity对象，默认False返回字典
             entity_num (int): 返回的最大实体数量，默认5个
+            contains_chinese (Optional[bool]): 调用方已知的语言检测结果，避免重复检测
             
         Returns:
             List[Dict[str, Any]] 或 List[Entity]: 实体列表
@@ -346,78 +475,73 @@ class SingletonNERModel:
             return []
         
         original_text = text.strip()
-        text = original_text
-        
-        # 检查文本长度并进行截断
-        # 这里虽然不能严格对应实际的512 tokens的长度
-        # 但是可以应付绝大部分场景
-        # 如果使用基于tokens的滑动窗口就有点复杂了
-        # 现在 simply,lovely
-        max_length = 500  # 保守的最大长度，确保分词后不超过512
-        if len(text) > max_length:
-            logger.warning(f"输入文本长度 {len(text)} 超过最大长度 {max_length}，将进行截断")
-            text = text[:max_length]
-        elif len(text) < 10:
-            logger.warning(f"输入文本长度 {len(text)} 过短，可能影响识别效果")
+        text = self._truncate_text(original_text)
         
         try:
-            # 执行命名实体识别
-            raw_entities = self.ner_pipeline(text)
-            
-            # 过滤低置信度的实体
-            filtered_entities = [
-                entity for entity in raw_entities 
-                if entity.get('score', 0) >= confidence_threshold
-            ]
-            
-            # 创建Entity对象或字典
-            entities = []
-            for entity_data in filtered_entities:
-                # 使用独立函数重建更友好的实体文本与词边界
-                # 避免出现识别出来的实体是一个被拆出来的子词（比如kagawa被识别成了#gawa）
-                clean_text, left, right = _reconstruct_entity_text_and_bounds(original_text, entity_data)
-
-                if return_objects:
-                    entity_obj = Entity(
-                        entity_group=entity_data.get('entity_group', 'UNKNOWN'),
-                        entity_text=clean_text,
-                        score=round(entity_data.get('score', 0), 4),
-                        start=left,
-                        end=right
-                    )
-                    entities.append(entity_obj)
-                else:
-                    entities.append({
-                        'entity_group': entity_data.get('entity_group', 'UNKNOWN'),
-                        'entity': clean_text,
-                        'score': round(entity_data.get('score', 0), 4),
-                        'start': left,
-                        'end': right
-                    })
-            
-            # 根据置信度对实体进行排序（降序排列）
-            if return_objects:
-                entities.sort(key=lambda x: x.score, reverse=True)
-            else:
-                entities.sort(key=lambda x: x['score'], reverse=True)
-
-            # 使用有序集合去重并保留置信度最高的实体
-            unique_entities = OrderedDict()
-            for entity in entities:
-                if return_objects:
-                    entity_key = (entity.entity_group, entity.entity_text)
-                else:
-                    entity_key = (entity['entity_group'], entity['entity'])
-                if entity_key not in unique_entities:
-                    unique_entities[entity_key] = entity
-                if len(unique_entities) >= entity_num:
-                    break
-
-            return list(unique_entities.values())
+            # 执行命名实体识别，关闭autograd以减少框架开销
+            with _ner_intra_op_threads(), torch.inference_mode():
+                raw_entities = self.ner_pipeline(text)
+            return self._postprocess_entities(
+                original_text, raw_entities, confidence_threshold,
+                return_objects, entity_num, contains_chinese
+            )
             
         except Exception as e:
             logger.error(f"实体识别失败: {e}")
             return []
+
+    def extract_entities_batch(self,
+                               texts: List[str],
+                               confidence_threshold: float = 0.7,
+                               return_objects: bool = False,
+                               entity_num: int = 5,
+                               contains_chinese: Optional[bool] = None
+    ) -> List[List[Any]]:
+        """
+        批量提取命名实体，以 Dataset 流式送入 pipeline 完成所有文本的分词与前向推理
+        
+        Args:
+            texts (List[str]): 输入文本列表
+            其余参数同 extract_entities
+            
+        Returns:
+            List[List[Dict[str, Any]]] 或 List[List[Entity]]: 与输入一一对应的实体列表
+        """
+        results: List[List[Any]] = [[] for _ in texts]
+        # 空文本不送入模型，直接返回空列表
+        indices = [i for i, text in enumerate(texts) if text and text.strip()]
+        if not indices:
+            return results
+
+        original_texts = [texts[i].strip() for i in indices]
+        batch = [self._truncate_text(text) for text in original_texts]
+        # CPU 场景下额外的 DataLoader 进程只会带来 fork 开销，仍可享受 pipeline 内部的迭代预取
+        num_workers = 0 if self.device == "cpu" else 2
+        try:
+            # 按 token 长度排序后再分批，同一批次内长度相近，减少 padding 浪费
+            lengths = self.tokenizer(batch, truncation=True, return_length=True)["length"]
+            order = sorted(range(len(batch)), key=lambda k: lengths[k])
+            dataset = _TextDataset([batch[k] for k in order])
+            with _ner_intra_op_threads(), torch.inference_mode():
+                sorted_outputs = list(self.ner_pipeline(dataset, batch_size=NER_BATCH_SIZE, num_workers=num_workers))
+        except Exception as e:
+            logger.error(f"批量实体识别失败: {e}")
+            return results
+
+        # 还原为输入顺序
+        raw_batch: List[Any] = [None] * len(batch)
+        for k, raw_entities in zip(order, sorted_outputs):
+            raw_batch[k] = raw_entities
+
+        for i, original_text, raw_entities in zip(indices, original_texts, raw_batch):
+            try:
+                results[i] = self._postprocess_entities(
+                    original_text, raw_entities, confidence_threshold,
+                    return_objects, entity_num, contains_chinese
+                )
+            except Exception as e:
+                logger.error(f"实体识别失败: {e}")
+        return results
     
     def get_entity_types(self, text: str, confidence_threshold: float = 0.5) -> List[str]:
         """
@@ -459,9 +583,13 @@ _english_ner_model: SingletonNERModel = SingletonNERModel(ENGLISH_MODEL_NAME)
 _model_lock = threading.Lock()
 
 
+# 短文本直接逐字符判断，长文本才值得付出编码成码点数组的开销
+_CHINESE_SCAN_MIN_LENGTH = 64
+
 def _is_chinese_text(text: str) -> bool:
     """
     简单的中文文本检测
+    长文本会被转换为 uint32 码点数组，用 numpy 做向量化的区间判断
     
     Args:
         text (str): 要检测的文本
@@ -473,18 +601,41 @@ def _is_chinese_text(text: str) -> bool:
         return False
     
     # 检查是否包含中文字符（Unicode范围：\u4e00-\u9fff）
-    for char in text:
-        if '\u4e00' <= char <= '\u9fff':
-            return True
-    return False
+    if len(text) < _CHINESE_SCAN_MIN_LENGTH:
+        for char in text:
+            if '\u4e00' <= char <= '\u9fff':
+                return True
+        return False
+    code_points = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    return bool(((code_points >= 0x4e00) & (code_points <= 0x9fff)).any())
+
+# 组成英文单词的字符：ASCII 字母数字以及少量连接符
+_WORD_RE = re.compile(r"[A-Za-z0-9\-_.&']+")
+
+def _compute_word_bounds(text: str) -> Tuple[List[int], List[int]]:
+    """
+    一次性计算文本中所有英文单词的 [start, end) 区间，供实体边界扩展时二分查找
+
+    Returns:
+        Tuple[List[int], List[int]]: 单词起始位置列表与结束位置列表（均为升序）
+    """
+    starts, ends = [], []
+    for m in _WORD_RE.finditer(text):
+        starts.append(m.start())
+        ends.append(m.end())
+    return starts, ends
 
 # 模块级函数：_reconstruct_entity_text_and_bounds
-def _reconstruct_entity_text_and_bounds(original_text: str, entity_data: Dict[str, Any]):
+def _reconstruct_entity_text_and_bounds(original_text: str, entity_data: Dict[str, Any],
+                                       contains_chinese: Optional[bool] = None,
+                                       word_bounds: Optional[Tuple[List[int], List[int]]] = None):
     """
     基于原文和 NER 输出的起止位置，重建更友好的实体文本：
     - 向左右扩展到完整英文单词边界（仅 ASCII 英文字母）
     - 去除 WordPiece 前缀“##”
     - 中文场景移除空格
+    contains_chinese: 原文是否包含中文；为 False 时实体文本必然不含中文，可跳过检测
+    word_bounds: 原文的英文单词区间（_compute_word_bounds 的结果），同一段原文的多个实体可共用
     返回: (clean_text, left_idx, right_idx)
     """
 
@@ -501,18 +652,22 @@ def _reconstruct_entity_text_and_bounds(original_text: str, entity_data: Dict[st
         start, end = 0, 0
 
     # 仅在英文场景扩展词边界
-    # 但是这个函数现在还很暴力
-    def is_letter(ch: str) -> bool:
-        allowed = "-_.&'’"
-        return ch.isascii() and (ch.isalnum() or ch in allowed)
+    # 通过预先计算好的英文单词区间做二分查找，避免逐字符扫描
+    if word_bounds is None:
+        word_bounds = _compute_word_bounds(original_text)
+    word_starts, word_ends = word_bounds
 
     left, right = start, end
-    # 向左扩展到完整英文单词边界
-    while left > 0 and is_letter(original_text[left - 1]):
-        left -= 1
-    # 向右扩展到完整英文单词边界
-    while right < n and is_letter(original_text[right]):
-        right += 1
+    # 向左扩展到完整英文单词边界：找到包含 start-1 的单词
+    if left > 0:
+        idx = bisect.bisect_right(word_starts, left - 1) - 1
+        if idx >= 0 and word_ends[idx] > left - 1:
+            left = word_starts[idx]
+    # 向右扩展到完整英文单词边界：找到包含 end 的单词
+    if right < n:
+        idx = bisect.bisect_right(word_starts, right) - 1
+        if idx >= 0 and word_ends[idx] > right:
+            right = word_ends[idx]
 
     # 原文切片优先
     full_text = original_text[left:right].strip() if left < right else ""
@@ -525,7 +680,7 @@ def _reconstruct_entity_text_and_bounds(original_text: str, entity_data: Dict[st
     full_text = full_text.replace("##", "")
 
     # 中文场景移除空格
-    if _is_chinese_text(full_text):
+    if contains_chinese is not False and _is_chinese_text(full_text):
         full_text = full_text.replace(" ", "")
 
     return full_text, left, right
@@ -549,8 +704,9 @@ def extract_entities_auto(text: str, confidence_threshold: float = 0.5,
         return []
 
     
-    # 检测语言并选择对应模型
-    if _is_chinese_text(text):
+    # 检测语言并选择对应模型，检测结果会传给下游复用
+    is_chinese = _is_chinese_text(text)
+    if is_chinese:
         logger.debug("检测到中文文本，使用中文模型")
         model: SingletonNERModel = _chinese_ner_model
     else:
@@ -558,18 +714,63 @@ def extract_entities_auto(text: str, confidence_threshold: float = 0.5,
         model: SingletonNERModel = _english_ner_model
     
     # 调用对应模型进行实体识别
-    return model.extract_entities(text, confidence_threshold, return_objects, entity_num)
+    return model.extract_entities(text, confidence_threshold, return_objects, entity_num, is_chinese)
+
+def _format_header_with_entities(header: str, entities: List[Dict[str, Any]]) -> str:
+    """
+    将实体文本拼接到标题尾部，没有实体时原样返回标题
+    """
+    entity_texts: list[str] = [e.get('entity') for e in entities if e.get('entity')]
+    if header and entity_texts:
+        displayed_entities = ', '.join(entity_texts)
+        return f"{header} | ({displayed_entities})"
+    return header
 
 def append_entities_to_header(header: str, chunk: str) -> str:
     """
     提取实体信息并将其添加到标题尾部。
     """
-    processed_header = None
     try:
-        entities: list[str] = [e.get('entity') for e in extract_entities_auto(chunk) if e.get('entity')]
-        if header and entities:
-            displayed_entities = ', '.join(entities)
-            processed_header = f"{header} | ({displayed_entities})"
+        return _format_header_with_entities(header, extract_entities_auto(chunk))
     except Exception as e:
         logger.warning(f"提取实体时发生异常: {e}")
-    return processed_header if processed_header is not None else header
\ No newline at end of file
+    return header
+
+def append_entities_to_headers(pairs: List[Tuple[str, str]]) -> List[str]:
+    """
+    append_entities_to_header 的批量版本。
+    按语言将文本块分组，每种语言只调用一次 extract_entities_batch，再按原顺序拼回标题。
+    
+    Args:
+        pairs: (header, chunk) 列表
+        
+    Returns:
+        List[str]: 与输入一一对应的处理后标题
+    """
+    headers = [header for header, _ in pairs]
+    chinese_indices, english_indices = [], []
+    for i, (_, chunk) in enumerate(pairs):
+        if not chunk or not chunk.strip():
+            continue
+        if _is_chinese_text(chunk):
+            chinese_indices.append(i)
+        else:
+            english_indices.append(i)
+
+    for model, indices, is_chinese in (
+        (_chinese_ner_model, chinese_indices, True),
+        (_english_ner_model, english_indices, False),
+    ):
+        if not indices:
+            continue
+        try:
+            batch_entities = model.extract_entities_batch(
+                [pairs[i][1] for i in indices],
+                confidence_threshold=0.5,
+                contains_chinese=is_chinese
+            )
+            for i, entities in zip(indices, batch_entities):
+                headers[i] = _format_header_with_entities(headers[i], entities)
+        except Exception as e:
+            logger.warning(f"批量提取实体时发生异常: {e}")
+    return headers
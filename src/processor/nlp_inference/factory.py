@@ -1,5 +1,5 @@
 from .interfaces import EmbeddingClient, NERClient
-from .local_impl import LocalEmbeddingClient, LocalNERClient
+from .local_impl import EMB_BACKEND, LocalEmbeddingClient, LocalNERClient, OnnxEmbeddingClient
 
 class InferenceFactory:
     """
@@ -10,6 +10,8 @@ class InferenceFactory:
     """
     @staticmethod
     def get_embedding_client() -> EmbeddingClient:
+        if EMB_BACKEND == "onnx_int8":
+            return OnnxEmbeddingClient()
         return LocalEmbeddingClient()
 
     @staticmethod
@@ -1,12 +1,12 @@
 from typing import List, Union, Dict, Any, Optional
 import numpy as np
 import os
+import re
+import heapq
 import threading
-from collections import OrderedDict
 import torch
 from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-from transformers.pipelines import Pipeline
+from transformers import AutoTokenizer, AutoModelForTokenClassification
 from transformers.modeling_utils import PreTrainedModel
 from transformers.tokenization_utils_base import PreTrainedTokenizerBase
 from loguru import logger
@@ -16,14 +16,57 @@ from ..named_entity_recognition import Entity
 
 DEVICE_MODE = os.getenv("DEFAULT_CUDA_DEVICE", "cuda")
 
+# CJK 统一表意文字区间
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+# 实体边界扩展所用的单词字符（仅 ASCII 字母数字及 -_.&'）
+# 向左用字符集合逐字回退（只走过单词本身），向右用锚定在 end 处的正则
+_WORD_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.&'-")
+_RIGHT_WORD_RE = re.compile(r"[A-Za-z0-9_.&'-]+")
+
 # 预设好NER模型的名称
 MODEL_NAME = "uer/roberta-base-finetuned-cluener2020-chinese"
 ENGLISH_MODEL_NAME = "elastic/distilbert-base-cased-finetuned-conll03-english"
+# 单次前向的批大小
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", "16"))
+# CPU 推理时是否对 Linear 层做动态 INT8 量化，不支持 VNNI 的 CPU 上可能反而变慢，默认关闭
+NER_QUANTIZE = os.getenv("NER_QUANTIZE", "0") == "1"
+# CUDA 推理时是否使用半精度权重（Ampere 及以上使用 bf16，否则 fp16）
+NER_FP16 = os.getenv("NER_FP16", "1") == "1"
+# 向量化的批大小
+EMB_BATCH_SIZE = int(os.getenv("EMB_BATCH", "64"))
+# NER 推理后端，设置为 onnx 时使用 ONNX Runtime（依赖 optimum[onnxruntime]）
+NER_BACKEND = os.getenv("NER_BACKEND", "torch").lower()
+# 导出后的 ONNX 模型缓存目录
+NER_ONNX_CACHE_DIR = os.path.expanduser(os.getenv("NER_ONNX_CACHE_DIR", "~/.cache/jumo_ner"))
+# 向量化后端，设置为 onnx_int8 时使用 ONNX Runtime + 动态 INT8 量化模型（依赖 optimum[onnxruntime]）
+EMB_BACKEND = os.getenv("EMB_BACKEND", "sentence_transformers").lower()
+# 量化后的向量模型缓存目录
+EMB_ONNX_CACHE_DIR = os.path.expanduser(os.getenv("EMB_ONNX_CACHE_DIR", "~/.cache/jumo_emb"))
+# ONNX 向量模型的池化方式，bge 系列使用 cls，其他 sentence-transformers 模型多为 mean
+EMB_POOLING = os.getenv("EMB_POOLING", "cls").lower()
+# 是否在加载时用 torch.compile 编译 GPU 上的 NER / 向量模型，默认关闭
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0") == "1"
+
+
+def _maybe_compile(module: torch.nn.Module, device: str) -> torch.nn.Module:
+    """
+    在 GPU 设备上用 torch.compile 编译模型，环境不支持时原样返回
+    """
+    if not TORCH_COMPILE or device == "cpu" or not hasattr(torch, "compile"):
+        return module
+    if "inductor" not in torch._dynamo.list_backends():
+        logger.warning("torch.compile 的 inductor 后端不可用，跳过编译")
+        return module
+    try:
+        return torch.compile(module, mode="reduce-overhead", dynamic=True)
+    except Exception as e:
+        logger.warning(f"torch.compile 编译失败，使用未编译的模型: {e}")
+        return module
 
 
 class LocalNERClient(NERClient):
     """
-    Local implementation of NERClient using Transformers Pipeline.
+    Local implementation of NERClient using Transformers token-classification models.
     自动选择中英文模型
     Uses singleton pattern for the underlying models to save resources.
     """
@@ -39,7 +82,6 @@ class LocalNERClient(NERClient):
             self.device: str = self._get_optimal_device(device)
             self.tokenizer: Optional[PreTrainedTokenizerBase] = None
             self.model: Optional[PreTrainedModel] = None
-            self.ner_pipeline: Optional[Pipeline] = None
             self._load_model()
         
         def _get_optimal_device(self, device: Optional[str] = None) -> str:
@@ -63,6 +105,9 @@ class LocalNERClient(NERClient):
             try:
                 logger.info(f"正在加载NER模型: {self.model_name}")
                 self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                if NER_BACKEND == "onnx":
+                    self._load_onnx_model()
+                    return
                 self.model = AutoModelForTokenClassification.from_pretrained(self.model_name)
                 if self.device != "cpu":
                     try:
@@ -70,66 +115,180 @@ class LocalNERClient(NERClient):
                     except Exception as e:
                         logger.warning(f"无法将模型移动到 {self.device}，回退到CPU: {e}")
                         self.device = "cpu"
-                self.ner_pipeline = pipeline(
-                    "ner", model=self.model, tokenizer=self.tokenizer, 
-                    device=0 if self.device == "cuda" else -1, 
-                    aggregation_strategy="simple"
-                )
+                if self.device == "cuda" and NER_FP16:
+                    dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+                    self.model = self.model.to(dtype=dtype)
+                    logger.info(f"NER模型使用半精度推理: {dtype}")
+                self.model = _maybe_compile(self.model, self.device)
+                if self.device == "cpu" and NER_QUANTIZE:
+                    self._quantize_model()
+                if TORCH_COMPILE and self.device != "cpu":
+                    # 预热一次前向，在加载阶段而不是首个请求时触发编译
+                    self._run(["warmup"])
                 logger.info("NER模型加载完成")
             except Exception as e:
                 logger.error(f"加载NER模型失败: {e}")
                 raise
         
+        def _load_onnx_model(self):
+            """
+            使用 ONNX Runtime 推理，首次加载时导出 ONNX 模型并缓存，之后直接读取缓存
+            """
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForTokenClassification
+
+            use_cuda = self.device == "cuda"
+            provider = "CUDAExecutionProvider" if use_cuda else "CPUExecutionProvider"
+            session_options = onnxruntime.SessionOptions()
+            session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+            cache_dir = os.path.join(NER_ONNX_CACHE_DIR, self.model_name.replace("/", "__"))
+            if os.path.exists(os.path.join(cache_dir, "model.onnx")):
+                self.model = ORTModelForTokenClassification.from_pretrained(
+                    cache_dir, provider=provider, session_options=session_options
+                )
+            else:
+                logger.info(f"正在导出ONNX模型: {self.model_name} -> {cache_dir}")
+                self.model = ORTModelForTokenClassification.from_pretrained(
+                    self.model_name, export=True, provider=provider, session_options=session_options
+                )
+                self.model.save_pretrained(cache_dir)
+            if not use_cuda:
+                self.device = "cpu"
+            logger.info(f"NER模型加载完成（ONNX Runtime, {provider}）")
+
+        def _quantize_model(self):
+            """
+            对 Linear 层做动态 INT8 量化，x86 使用 fbgemm，ARM 使用 qnnpack
+            """
+            engines = torch.backends.quantized.supported_engines
+            engine = "fbgemm" if "fbgemm" in engines else "qnnpack"
+            if engine not in engines:
+                logger.warning(f"当前平台不支持动态量化，保持FP32推理: {engines}")
+                return
+            torch.backends.quantized.engine = engine
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            logger.info(f"NER模型已动态量化为INT8，quantized engine = '{engine}'")
+
+        @staticmethod
+        def _split_label(label: str):
+            """
+            拆分 BIO 标签，返回 (前缀, 类别)，与 transformers pipeline 的 get_tag 一致，O 视为 ("I", "O")
+            """
+            if label.startswith("B-") or label.startswith("I-"):
+                return label[0], label[2:]
+            return "I", label
+
+        def _run(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+            """
+            直接调用模型做一次批量前向，按 aggregation_strategy="simple" 的规则合并连续的同类 token，
+            输出格式与 transformers NER pipeline 相同（entity_group / score / word / start / end）
+            """
+            encoded = self.tokenizer(
+                texts, padding=True, truncation=True, max_length=512,
+                return_offsets_mapping=True, return_special_tokens_mask=True, return_tensors="pt"
+            )
+            offsets = encoded.pop("offset_mapping").tolist()
+            special_mask = encoded.pop("special_tokens_mask").tolist()
+            input_ids = encoded["input_ids"].tolist()
+            with torch.inference_mode():
+                logits = self.model(**encoded.to(self.device)).logits
+                scores, label_ids = torch.softmax(logits.float(), dim=-1).max(dim=-1)
+            scores, label_ids = scores.cpu().tolist(), label_ids.cpu().tolist()
+            id2label = self.model.config.id2label
+
+            outputs = []
+            for b in range(len(texts)):
+                # 合并连续同类 token：类别相同且不是 B- 开头时并入当前分组
+                groups = []
+                for t, (is_special, label_id) in enumerate(zip(special_mask[b], label_ids[b])):
+                    if is_special:
+                        continue
+                    bi, tag = self._split_label(id2label[label_id])
+                    if groups and groups[-1][0] == tag and bi != "B":
+                        groups[-1][1].append(t)
+                    else:
+                        groups.append((tag, [t]))
+
+                entities = []
+                for tag, token_idx in groups:
+                    if tag == "O":
+                        continue
+                    tokens = self.tokenizer.convert_ids_to_tokens([input_ids[b][t] for t in token_idx])
+                    entities.append({
+                        'entity_group': tag,
+                        'score': sum(scores[b][t] for t in token_idx) / len(token_idx),
+                        'word': self.tokenizer.convert_tokens_to_string(tokens),
+                        'start': offsets[b][token_idx[0]][0],
+                        'end': offsets[b][token_idx[-1]][1]
+                    })
+                outputs.append(entities)
+            return outputs
+
         def extract_entities(self, text: str, confidence_threshold: float = 0.7, 
                             return_objects: bool = False, entity_num: int = 5) -> List[Union[Dict[str, Any], Entity]]:
-            if not text or not text.strip():
-                return []
-            original_text = text.strip()
-            text = original_text[:500] # Truncate for safety
-            
+            return self.extract_entities_batch(
+                [text], confidence_threshold=confidence_threshold,
+                return_objects=return_objects, entity_num=entity_num
+            )[0]
+
+        def extract_entities_batch(self, texts: List[str], confidence_threshold: float = 0.7,
+                                   return_objects: bool = False, entity_num: int = 5) -> List[List[Union[Dict[str, Any], Entity]]]:
+            """
+            批量实体识别，按 NER_BATCH_SIZE 合并前向
+            返回结果与输入一一对应，空文本对应空列表
+            """
+            results: List[List[Union[Dict[str, Any], Entity]]] = [[] for _ in texts]
+            indices = [i for i, text in enumerate(texts) if text and text.strip()]
+            if not indices:
+                return results
+
+            original_texts = [texts[i].strip() for i in indices]
+            # 按长度排序后再分批，同一批次内长度相近，减少 padding 浪费
+            order = sorted(range(len(original_texts)), key=lambda k: len(original_texts[k]))
             try:
-                raw_entities = self.ner_pipeline(text)
-                filtered_entities = [e for e in raw_entities if e.get('score', 0) >= confidence_threshold]
-                
-                entities = []
-                for entity_data in filtered_entities:
-                    clean_text, left, right = LocalNERClient._reconstruct_entity_text_and_bounds(original_text, entity_data)
-                    
-                    entity_dict = {
-                        'entity_group': entity_data.get('entity_group', 'UNKNOWN'),
-                        'entity': clean_text,
-                        'score': round(entity_data.get('score', 0), 4),
-                        'start': left,
-                        'end': right
-                    }
-
-                    if return_objects:
-                        entities.append(Entity(
-                            entity_group=entity_dict['entity_group'],
-                            entity_text=entity_dict['entity'],
-                            score=entity_dict['score'],
-                            start=entity_dict['start'],
-                            end=entity_dict['end']
-                        ))
-                    else:
-                        entities.append(entity_dict)
-                
-                # Sort and deduplicate
-                key_func = lambda x: x.score if return_objects else x['score']
-                entities.sort(key=key_func, reverse=True)
-                
-                unique_entities = OrderedDict()
-                for entity in entities:
-                    key = (entity.entity_group, entity.entity_text) if return_objects else (entity['entity_group'], entity['entity'])
-                    if key not in unique_entities:
-                        unique_entities[key] = entity
-                    if len(unique_entities) >= entity_num:
-                        break
-                return list(unique_entities.values())
-                
+                sorted_texts = [original_texts[k][:500] for k in order] # Truncate for safety
+                sorted_outputs = []
+                for begin in range(0, len(sorted_texts), NER_BATCH_SIZE):
+                    sorted_outputs.extend(self._run(sorted_texts[begin:begin + NER_BATCH_SIZE]))
             except Exception as e:
                 logger.error(f"实体识别失败: {e}")
-                return []
+                return results
+
+            for k, raw_entities in zip(order, sorted_outputs):
+                try:
+                    results[indices[k]] = self._postprocess_entities(
+                        original_texts[k], raw_entities, confidence_threshold, return_objects, entity_num
+                    )
+                except Exception as e:
+                    logger.error(f"实体识别失败: {e}")
+            return results
+
+        @staticmethod
+        def _postprocess_entities(original_text: str, raw_entities: List[Dict[str, Any]],
+                                  confidence_threshold: float, return_objects: bool,
+                                  entity_num: int) -> List[Union[Dict[str, Any], Entity]]:
+            # 先按 (类别, 实体文本) 去重，每个键只保留最高分，再对去重后的少量结果取 Top-K
+            best: Dict[tuple, tuple] = {}
+            for entity_data in raw_entities:
+                if entity_data.get('score', 0) < confidence_threshold:
+                    continue
+                score = round(entity_data.get('score', 0), 4)
+                clean_text, left, right = LocalNERClient._reconstruct_entity_text_and_bounds(original_text, entity_data)
+                key = (entity_data.get('entity_group', 'UNKNOWN'), clean_text)
+                if key not in best or score > best[key][0]:
+                    best[key] = (score, left, right)
+
+            top = heapq.nlargest(entity_num, best.items(), key=lambda item: item[1][0])
+            if return_objects:
+                return [
+                    Entity(entity_group=group, entity_text=text, score=score, start=left, end=right)
+                    for (group, text), (score, left, right) in top
+                ]
+            return [
+                {'entity_group': group, 'entity': text, 'score': score, 'start': left, 'end': right}
+                for (group, text), (score, left, right) in top
+            ]
 
     def __init__(self):
         # Initialize both models
@@ -143,12 +302,7 @@ class LocalNERClient(NERClient):
         return True if text contains any Chinese character
         如果检测到是中文，则返回True，否则返回False
         """
-        if not text:
-            return False
-        for char in text:
-            if '\u4e00' <= char <= '\u9fff':
-                return True
-        return False
+        return bool(text) and _CJK_RE.search(text) is not None
 
     @staticmethod
     def _reconstruct_entity_text_and_bounds(original_text: str, entity_data: Dict[str, Any]):
@@ -168,15 +322,11 @@ class LocalNERClient(NERClient):
         if start >= end:
             start, end = 0, 0
 
-        def is_letter(ch: str) -> bool:
-            allowed = "-_.&'’"
-            return ch.isascii() and (ch.isalnum() or ch in allowed)
-
-        left, right = start, end
-        while left > 0 and is_letter(original_text[left - 1]):
+        left = start
+        while left > 0 and original_text[left - 1] in _WORD_CHARS:
             left -= 1
-        while right < n and is_letter(original_text[right]):
-            right += 1
+        m = _RIGHT_WORD_RE.match(original_text, end)
+        right = m.end() if m else end
 
         full_text = original_text[left:right].strip() if left < right else ""
         if not full_text:
@@ -221,17 +371,94 @@ class LocalEmbeddingClient(EmbeddingClient):
     Local implementation of EmbeddingClient using SentenceTransformer.
     Uses singleton pattern for the underlying model to save resources.
     """
-    _model_instance = None
+    _model_cache: Dict[tuple, SentenceTransformer] = {}
     _lock = threading.Lock()
 
     def __init__(self, model_id='BAAI/bge-small-zh-v1.5', mirror=True, device=DEVICE_MODE):
-        if LocalEmbeddingClient._model_instance is None:
+        # 按 (模型, 设备) 共享实例，同一组合只加载一份权重
+        key = (model_id, device)
+        if key not in LocalEmbeddingClient._model_cache:
             with LocalEmbeddingClient._lock:
-                if LocalEmbeddingClient._model_instance is None:
+                if key not in LocalEmbeddingClient._model_cache:
                     print(f"正在通过{os.getenv('HF_ENDPOINT')}加载模型：{model_id}（mirror={mirror}）,device={device}")
-                    LocalEmbeddingClient._model_instance = SentenceTransformer(model_id, device=f'{DEVICE_MODE}')
+                    model = SentenceTransformer(model_id, device=device)
+                    if TORCH_COMPILE and not str(device).startswith("cpu"):
+                        model[0].auto_model = _maybe_compile(model[0].auto_model, device)
+                        model.encode(["warmup"], show_progress_bar=False)
+                    LocalEmbeddingClient._model_cache[key] = model
                     print("模型加载完成。")
-        self.model = LocalEmbeddingClient._model_instance
+        self.model = LocalEmbeddingClient._model_cache[key]
 
     def encode(self, sentences: Union[str, List[str]], **kwargs) -> Union[List[float], List[List[float]], np.ndarray]:
-        return self.model.encode(sentences, **kwargs)
\ No newline at end of file
+        # SentenceTransformer.encode 内部已按文本长度排序分批再还原顺序，这里只补齐默认参数
+        kwargs.setdefault("batch_size", EMB_BATCH_SIZE)
+        kwargs.setdefault("normalize_embeddings", True)
+        kwargs.setdefault("convert_to_numpy", True)
+        kwargs.setdefault("show_progress_bar", False)
+        return self.model.encode(sentences, **kwargs)
+
+
+class OnnxEmbeddingClient(EmbeddingClient):
+    """
+    基于 ONNX Runtime 的向量化实现，首次加载时导出并做动态 INT8 量化（AVX512-VNNI 配置）后缓存，
+    直接运行 ORT 会话并自行池化、归一化，绕过 SentenceTransformer 的封装开销
+    """
+    _model_cache: Dict[str, tuple] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model_id='BAAI/bge-small-zh-v1.5'):
+        if model_id not in OnnxEmbeddingClient._model_cache:
+            with OnnxEmbeddingClient._lock:
+                if model_id not in OnnxEmbeddingClient._model_cache:
+                    OnnxEmbeddingClient._model_cache[model_id] = self._load_model(model_id)
+        self.tokenizer, self.model = OnnxEmbeddingClient._model_cache[model_id]
+
+    @staticmethod
+    def _load_model(model_id: str):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        cache_dir = os.path.join(EMB_ONNX_CACHE_DIR, model_id.replace("/", "__"))
+        quantized_file = "model_quantized.onnx"
+        if not os.path.exists(os.path.join(cache_dir, quantized_file)):
+            logger.info(f"正在导出并量化向量模型: {model_id} -> {cache_dir}")
+            export_dir = os.path.join(cache_dir, "fp32")
+            ORTModelForFeatureExtraction.from_pretrained(model_id, export=True).save_pretrained(export_dir)
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=cache_dir, quantization_config=qconfig)
+            AutoTokenizer.from_pretrained(model_id).save_pretrained(cache_dir)
+        tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+        model = ORTModelForFeatureExtraction.from_pretrained(cache_dir, file_name=quantized_file)
+        logger.info(f"ONNX INT8 向量模型加载完成: {model_id}")
+        return tokenizer, model
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> Union[List[float], List[List[float]], np.ndarray]:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = kwargs.get("batch_size", EMB_BATCH_SIZE)
+        normalize = kwargs.get("normalize_embeddings", True)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        # 按长度排序分批，减少 padding，最后还原顺序
+        order = sorted(range(len(texts)), key=lambda k: len(texts[k]))
+        embeddings = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        for begin in range(0, len(order), batch_size):
+            batch_idx = order[begin:begin + batch_size]
+            inputs = self.tokenizer(
+                [texts[k] for k in batch_idx], padding=True, truncation=True,
+                max_length=512, return_tensors="np"
+            )
+            hidden = self.model(**inputs).last_hidden_state
+            hidden = hidden.numpy() if hasattr(hidden, "numpy") else np.asarray(hidden)
+            if EMB_POOLING == "mean":
+                mask = inputs["attention_mask"][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            else:
+                pooled = hidden[:, 0]
+            embeddings[batch_idx] = pooled
+
+        if normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,194 @@
+"""
+PDF 处理公共流程
+================
+
+`pdf_processor`（pipeline 后端）与 `vlm_mode`（VLM 后端）共用的处理骨架：
+
+-   **前置处理**: 校验扩展名、从 MinIO 下载源文件、图片/Office 转 PDF、按需截取页范围、准备输出目录。
+-   **文档分析**: 由子类实现 `analyze`，返回 `middle_json`；`union_make` 指定对应后端的内容生成函数。
+-   **后置处理**: 并发上传图片、Markdown、切分后的 Markdown、content_list 与 middle_json，写入 `output_info` 并更新任务。
+"""
+import os
+import tempfile
+import json
+import datetime
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+from loguru import logger
+from minio.error import S3Error
+
+from mineru.cli.common import convert_pdf_bytes_to_bytes_by_pypdfium2, prepare_env
+from mineru.data.data_reader_writer import FileBasedDataWriter
+from mineru.utils.enum_class import MakeMode
+
+from data.model import Task
+from wrapper.logger import log_with_time_consumption
+from utils.minio_tool import MinioConnection
+from const.file_extensions import OFFICE_EXTENSIONS, PDF_EXTENSIONS, IMAGE_EXTENSIONS
+from data.operation import TaskRepository
+from processor.markdown_splitter import process_markdown
+from processor.converters.file_converters import office_bytes_to_pdf_bytes, image_bytes_to_pdf_bytes
+
+# 结果文件并发上传 MinIO 的线程数
+MINIO_UPLOAD_WORKERS = int(os.getenv("MINIO_UPLOAD_WORKERS", "8"))
+
+
+class PDFProcessorBase(ABC):
+    """
+    PDF 处理骨架，子类只需实现 `analyze` 与 `union_make`
+    """
+    # 支持的文件类型，进程生命周期内不变，子类可覆盖
+    IMAGE_EXT = frozenset(IMAGE_EXTENSIONS)
+    OFFICE_EXT = frozenset(OFFICE_EXTENSIONS)
+    PDF_EXT = frozenset(PDF_EXTENSIONS)
+
+    def __init__(self, minio_tool: MinioConnection, task_repository: TaskRepository):
+        self.minio_tool: MinioConnection = minio_tool
+        self.task_repository: TaskRepository = task_repository
+        self.allowed_ext = self.PDF_EXT | self.IMAGE_EXT | self.OFFICE_EXT
+
+    @abstractmethod
+    def analyze(self, pdf_bytes: bytes, current_task: Task, image_writer: FileBasedDataWriter) -> Dict[str, Any]:
+        """
+        调用具体后端分析 PDF，图片通过 image_writer 写入本地目录，返回 middle_json
+        """
+        pass
+
+    @abstractmethod
+    def union_make(self, pdf_info: List[Dict[str, Any]], make_mode: str, img_dir: str):
+        """
+        基于 middle_json 的 pdf_info 生成 Markdown / content_list
+        """
+        pass
+
+    def _load_pdf_bytes(self, current_task: Task, extension: str) -> bytes:
+        file_bytes = self.minio_tool.get_file_byte(
+            bucket_name=current_task.bucket_name,
+            object_name=current_task.object_key
+        )
+        # 为了支持图片和 Office 文件，需要先转换为 PDF
+        if extension in self.IMAGE_EXT:
+            file_bytes = image_bytes_to_pdf_bytes(file_bytes)
+        elif extension in self.OFFICE_EXT:
+            file_bytes = office_bytes_to_pdf_bytes(word_bytes=file_bytes, suffix=extension)
+
+        # 截取页范围（可配置），未指定页范围时直接使用原始字节，避免整份 PDF 的解析与重新序列化
+        start_page, end_page = getattr(current_task, 'start_page', 0), getattr(current_task, 'end_page', None)
+        if start_page or end_page is not None:
+            return convert_pdf_bytes_to_bytes_by_pypdfium2(file_bytes, start_page, end_page)
+        return file_bytes
+
+    @log_with_time_consumption(level="INFO")
+    # @with_gpu_selection
+    def _sync_process_pdf(self, current_task: Task):
+        try:
+            extension = os.path.splitext(current_task.object_key)[-1].lower()
+            if extension not in self.allowed_ext:
+                raise HTTPException(status_code=400, detail="不支持的文件类型")
+
+            pdf_bytes = self._load_pdf_bytes(current_task, extension)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                output_dir = os.path.join(temp_dir, "output")
+                os.makedirs(output_dir, exist_ok=True)
+
+                # 文件名处理
+                name_without_ext = os.path.splitext(os.path.basename(current_task.object_key))[0]
+                local_image_dir, local_md_dir = prepare_env(output_dir, name_without_ext, "auto")
+                image_writer = FileBasedDataWriter(local_image_dir)
+
+                middle_json = self.analyze(pdf_bytes, current_task, image_writer)
+                del pdf_bytes
+
+                images_list = self._upload_results(current_task, name_without_ext, local_image_dir, middle_json)
+
+                # 写入任务 output_info
+                current_task.output_info = json.dumps({
+                    "markdown": f"{current_task.task_id}/{name_without_ext}.md",
+                    "content_list": f"{current_task.task_id}/{name_without_ext}_content_list.json",
+                    "middle_json": f"{current_task.task_id}/{name_without_ext}_middle.json",
+                    "images": images_list,
+                    "splitted_markdown": f"{current_task.task_id}/{name_without_ext}_splitted.md"
+                })
+
+        except S3Error as e:
+            current_task.output_info = str(e)
+        except Exception as e:
+            logger.exception(e)
+            current_task.output_info = str(e)
+        finally:
+            current_task.finish_time = datetime.datetime.now()
+            self.task_repository.update_task(current_task)
+
+    def _upload_results(self, current_task: Task, name_without_ext: str,
+                        local_image_dir: str, middle_json: Dict[str, Any]) -> List[str]:
+        """
+        生成并上传结果文件，上传在线程池中进行，与 Markdown 切分、JSON 序列化重叠
+        返回上传的图片路径列表
+        """
+        bucket_name = current_task.output_bucket
+        prefix = f"{current_task.task_id}/{name_without_ext}"
+        images_dir = f"{current_task.task_id}/images"
+        images_list = []
+
+        # markdown 切分（含实体识别）最耗时，使用单独的线程，不与图片上传在同一线程池中排队
+        with ThreadPoolExecutor(max_workers=MINIO_UPLOAD_WORKERS) as upload_pool, \
+                ThreadPoolExecutor(max_workers=1) as split_pool:
+            upload_futures = []
+
+            def upload_bytes(object_name: str, file_bytes: bytes, content_type: str):
+                upload_futures.append(upload_pool.submit(
+                    self.minio_tool.upload_file_by_bytes,
+                    bucket_name=bucket_name,
+                    object_name=object_name,
+                    file_bytes=file_bytes,
+                    content_type=content_type
+                ))
+
+            # markdown 内容，一次 encode 即可丢弃非法代理字符
+            pdf_info = middle_json["pdf_info"]
+            md_bytes = self.union_make(pdf_info, MakeMode.MM_MD, images_dir).encode("utf-8", "ignore")
+            clean_md = md_bytes.decode("utf-8")
+            # 先开始切分，与下面的图片上传、JSON 序列化及上传并行
+            split_future = split_pool.submit(process_markdown, clean_md)
+            upload_bytes(f"{prefix}.md", md_bytes, "text/markdown")
+
+            # 上传图片
+            for root, _, files in os.walk(local_image_dir):
+                for file in files:
+                    if file.lower().endswith((".png", ".jpg", ".jpeg")):
+                        remote_path = f"{images_dir}/{file}"
+                        upload_futures.append(upload_pool.submit(
+                            self.minio_tool.upload_file_by_path,
+                            bucket_name=bucket_name,
+                            object_name=remote_path,
+                            file_path=os.path.join(root, file),
+                            content_type=f"image/{file.split('.')[-1]}"
+                        ))
+                        images_list.append(remote_path)
+
+            # content_list 内容
+            content_list = self.union_make(pdf_info, MakeMode.CONTENT_LIST, images_dir)
+            upload_bytes(
+                f"{prefix}_content_list.json",
+                json.dumps(content_list, ensure_ascii=False, indent=4).encode("utf-8", "ignore"),
+                "application/json"
+            )
+
+            # middle_json 内容
+            upload_bytes(
+                f"{prefix}_middle.json",
+                json.dumps(middle_json, ensure_ascii=False, indent=4).encode("utf-8", "ignore"),
+                "application/json"
+            )
+
+            # 切分处理后的markdown内容
+            upload_bytes(f"{prefix}_splitted.md", split_future.result().encode("utf-8"), "text/markdown")
+
+            # 等待所有上传完成
+            for future in upload_futures:
+                future.result()
+
+        return images_list
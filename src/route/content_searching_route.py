@@ -1,5 +1,10 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
 from fastapi import APIRouter
 from processor.content_indexing import DocumentIndexService
+from route.route_config import route_settings
 from utils.minio_tool import MinioConnection
 from fastapi import HTTPException
 from fastapi import Depends
@@ -8,25 +13,72 @@ from pydantic import BaseModel
 from typing import Optional
 
 router = APIRouter()
+# 进程内共享的单例，内部状态由各自的锁保护，通过依赖注入提供给路由
 content_indexing_service = DocumentIndexService()
 minio_tool = MinioConnection()
 
+
+def get_index_service() -> DocumentIndexService:
+    return content_indexing_service
+
+
+def get_minio_tool() -> MinioConnection:
+    return minio_tool
+
+# 搜索结果缓存：按 (task_id, keyword) 缓存，LRU 淘汰 + TTL 过期
+_search_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+
+def _get_cached_search(key: tuple):
+    with _search_cache_lock:
+        entry = _search_cache.get(key)
+        if entry is None:
+            return None
+        expire_at, result = entry
+        if expire_at < time.monotonic():
+            del _search_cache[key]
+            return None
+        _search_cache.move_to_end(key)
+        return result
+
+
+def _set_cached_search(key: tuple, result) -> None:
+    with _search_cache_lock:
+        _search_cache[key] = (time.monotonic() + route_settings.SEARCH_CACHE_TTL, result)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > route_settings.SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+
+def _invalidate_search_cache(task_id: str) -> None:
+    """
+    索引重建后清除该任务的全部缓存结果
+    """
+    with _search_cache_lock:
+        for key in [key for key in _search_cache if key[0] == task_id]:
+            del _search_cache[key]
+
 class SearchResponse(BaseModel):
     status: str
     message: Optional[str] = None
     data: Optional[dict] = None
 
 @router.post("/search_pave")
-def search_pave(task_id: str, 
+async def search_pave(task_id: str, 
                    bucket_name: str,
-                   minio_tool: MinioConnection = Depends()):
-    if not minio_tool.list_objects(bucket_name=bucket_name,prefix=f"{task_id}/",recursive=False):
+                   minio_tool: MinioConnection = Depends(get_minio_tool),
+                   index_service: DocumentIndexService = Depends(get_index_service)):
+    # MinIO 访问与索引构建都是阻塞调用，放到线程中执行，避免阻塞事件循环
+    if not await asyncio.to_thread(minio_tool.list_objects, bucket_name=bucket_name, prefix=f"{task_id}/", recursive=False):
         raise HTTPException(status_code=404, detail="任务不存在")
     try:
-        content_indexing_service.load_document_index_from_oss(task_id, bucket_name)
+        await asyncio.to_thread(index_service.load_document_index_from_oss, task_id, bucket_name)
     except FileNotFoundError:
         logger.error(f"索引文件不存在，task_id: {task_id}, bucket_name: {bucket_name}")
         raise HTTPException(status_code=404, detail="索引文件不存在")
+    finally:
+        _invalidate_search_cache(task_id)
     return SearchResponse(
         status="success",
         message="索引构建成功",
@@ -36,10 +88,21 @@ def search_pave(task_id: str,
 
 
 @router.get("/content_search")
-def content_search(task_id: str,
-                   keyword: str):
+async def content_search(task_id: str,
+                   keyword: str,
+                   index_service: DocumentIndexService = Depends(get_index_service)):
+    cache_key = (task_id, keyword)
     try:
-        result = content_indexing_service.search_keyword_in_document(task_id, keyword)
+        result = _get_cached_search(cache_key)
+        if result is None:
+            try:
+                result = await asyncio.to_thread(index_service.search_keyword, task_id, keyword)
+            except Exception as e:
+                # 与 search_keyword_in_document 一致返回空结果，但不写入缓存，Redis 等临时故障恢复后即可重新搜索
+                logger.warning(f"搜索关键词失败，task_id: {task_id}, keyword: {keyword}, error: {e}")
+                result = []
+            else:
+                _set_cached_search(cache_key, result)
         return SearchResponse(
             status="success",
             message="搜索成功",
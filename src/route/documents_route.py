@@ -4,38 +4,31 @@ pdf_route.py
 定义 PDF 相关的接口路由，包括分析 PDF 接口和查询任务状态接口。
 """
 
+import asyncio
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 import io
 from minio.error import S3Error
 from startup import minio_tool
+from utils.minio_tool import GeneratorStream, as_dir_prefix
+from route.route_config import route_settings
 from typing import Optional, List
 from const.file_extensions import WORD_EXTENTIONS,EXCEL_EXTENTIONS
 # 为了让接口返回压缩包
 import os
+import shutil
 import tempfile
+from uuid import uuid4
 from processor.converters.excel_to_markdown import excel_to_markdown
 from processor.converters.doc_to_markdown import doc_to_markdown
 from processor.markdown_splitter import process_markdown as split_markdown
+from processor.markdown_cache import new_content_hasher, markdown_cache_object, has_cached_markdown
 from pydantic import BaseModel
 from loguru import logger
 from fastapi import File, UploadFile
 import urllib.parse
 
 
-def ensure_utf8_string(content) -> str:
-    """确保内容是UTF-8字符串"""
-    if isinstance(content, bytes):
-        return content.decode('utf-8', errors='replace')
-    elif isinstance(content, str):
-        try:
-            content.encode('utf-8')
-            return content
-        except UnicodeEncodeError:
-            return content.encode('latin-1', errors='ignore').decode('utf-8', errors='replace')
-    return str(content)
-
-
 def safe_filename_for_header(filename: str) -> str:
     """为HTTP头部生成安全的文件名"""
     try:
@@ -46,11 +39,10 @@ def safe_filename_for_header(filename: str) -> str:
         return f"attachment; filename*=UTF-8''{encoded_filename}"
 # 实例化资源
 router = APIRouter()
-UPLOAD_BUCKET = os.getenv('UPLOAD_BUCKET', 'uploads')
 
 class AnalyzeResult(BaseModel):
+    # 只返回 Markdown 在输出桶中的路径，内容通过 /analyze-office-file/content 获取
     markdown_url: str
-    markdown_content: str
     images: Optional[List[str]] = None
 
 # 定义接口的返回体
@@ -60,8 +52,16 @@ class AnalyzeResponse(BaseModel):
     data: Optional[AnalyzeResult] = None
 
 
+def _download_to_path(bucket_name: str, object_name: str, file_path: str, hasher=None) -> None:
+    """
+    将对象流式写入本地文件（打开、写入都是阻塞操作，由调用方整体放到线程中执行）
+    """
+    with open(file_path, "wb") as fileobj:
+        minio_tool.stream_to_file(bucket_name, object_name, fileobj, hasher)
+
+
 @router.post("/analyze-office-file")
-def analyze_document(
+async def analyze_document(
     file_path: str, 
     bucket_name: str, 
     output_bucket: str,
@@ -74,55 +74,60 @@ def analyze_document(
     """
     try:
         # 先判断文件是否存在，如果存在则继续后续的分析流程
-        if not minio_tool.file_exists(bucket_name=bucket_name, object_name=file_path):
+        # MinIO 访问和文档转换都是阻塞调用，统一放到线程中执行，避免阻塞事件循环
+        if not await asyncio.to_thread(minio_tool.file_exists, bucket_name=bucket_name, object_name=file_path):
             raise HTTPException(status_code=404, detail="文件不存在")
         # 判断文件是excel还是word类型
         file_name, file_ext = os.path.splitext(file_path)
-        # 获取文件的字节流
-        file_content = minio_tool.get_file_byte(
-            bucket_name=bucket_name, 
-            object_name=file_path
-            )
-        markdown_content = ""
-        if file_ext in WORD_EXTENTIONS:
-            # 分析word文
-            with tempfile.NamedTemporaryFile(
-                delete=False,
-                suffix=file_ext
-            ) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-                # 获取markdown内容
-                raw_markdown = doc_to_markdown(
-                    input_data = temp_file_path,
-                    task_id = file_name,
-                    bucket = output_bucket
-                )
-                raw_markdown = ensure_utf8_string(raw_markdown)
-                markdown_content = split_markdown(raw_markdown)
-        elif file_ext in EXCEL_EXTENTIONS:
-            # 分析excel文件
-            markdown_content = ''.join(excel_to_markdown(file_content))
-        else:
+        file_ext = file_ext.lower()
+        if file_ext not in WORD_EXTENTIONS and file_ext not in EXCEL_EXTENTIONS:
             raise HTTPException(status_code=400, detail="不支持的文件类型")
+        # 中间文件统一放在请求级临时目录中，异常时也会随目录一起清理
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # 将对象流式写入临时文件，不在内存中保留完整的文件字节
+            temp_file_path = os.path.join(temp_dir, f"{uuid4().hex}{file_ext}")
+            # 下载的同时计算内容摘要，相同内容的文件直接复用之前的转换结果
+            hasher = new_content_hasher()
+            await asyncio.to_thread(_download_to_path, bucket_name, file_path, temp_file_path, hasher)
+            # Word 转换结果中的图片链接指向 file_name 目录，缓存键需包含该目录
+            cache_params = (file_name,) if file_ext in WORD_EXTENTIONS else ()
+            cache_object = markdown_cache_object(hasher, *cache_params)
+            markdown_object = f'{file_name}/{file_name}.md'
+            if await asyncio.to_thread(has_cached_markdown, minio_tool, output_bucket, cache_object):
+                # 命中缓存时在服务端复制，无需重新转换和上传
+                logger.info(f"命中 Markdown 缓存: {file_path} -> {cache_object}")
+                await asyncio.to_thread(minio_tool.copy_file, output_bucket, cache_object, markdown_object)
+            else:
+                if file_ext in WORD_EXTENTIONS:
+                    # 分析word文档，获取markdown内容
+                    raw_markdown = await asyncio.to_thread(
+                        doc_to_markdown,
+                        input_data = temp_file_path,
+                        task_id = file_name,
+                        bucket = output_bucket
+                    )
+                    markdown_chunks = [await asyncio.to_thread(split_markdown, raw_markdown)]
+                else:
+                    # 分析excel文件，保留分段结果，上传时逐段编码
+                    markdown_chunks = await asyncio.to_thread(excel_to_markdown, temp_file_path)
 
-        # 上传到minio
-        markdown_content = ensure_utf8_string(markdown_content)
-        markdown_bytes = markdown_content.encode('utf-8')
-        
-        minio_tool.upload_file_by_bytes(
-            bucket_name=output_bucket, 
-            object_name=f'{file_name}/{file_name}.md', 
-            file_bytes=markdown_bytes,
-            content_type='text/markdown; charset=utf-8'
-        )
+                # 流式上传到minio
+                uploaded = await asyncio.to_thread(
+                    minio_tool.upload_file_by_stream,
+                    bucket_name=output_bucket, 
+                    object_name=markdown_object, 
+                    stream=GeneratorStream(markdown_chunks),
+                    content_type='text/markdown; charset=utf-8'
+                )
+                if uploaded:
+                    # 写入缓存
+                    await asyncio.to_thread(minio_tool.copy_file, output_bucket, markdown_object, cache_object)
             
         return AnalyzeResponse(
             status="success",
             message="文件分析完成",
             data=AnalyzeResult(
-                markdown_url=f'{file_name}/{file_name}.md',
-                markdown_content=markdown_content
+                markdown_url=markdown_object
             )
         )
     except S3Error as e:
@@ -138,8 +143,80 @@ def analyze_document(
             data=None
         )
 
+@router.get("/analyze-office-file/content")
+def get_office_file_content(
+    markdown_url: str,
+    output_bucket: str
+):
+    """
+    按 /analyze-office-file 返回的 markdown_url 流式输出 Markdown 内容
+    """
+    if not minio_tool.file_exists(bucket_name=output_bucket, object_name=markdown_url):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return StreamingResponse(
+        minio_tool.iter_object(bucket_name=output_bucket, object_name=markdown_url),
+        media_type="text/markdown; charset=utf-8"
+    )
+
+
+def _process_office_object(obj: str, bucket_name: str, output_bucket: str, temp_dir: str) -> Optional[dict]:
+    """
+    处理目录下的单个 Office 文件：下载、转换为 markdown 并上传
+    中间文件写入调用方提供的临时目录 temp_dir
+    不支持的文件类型返回 None
+    """
+    file_name, file_ext = os.path.splitext(obj)
+    file_ext = file_ext.lower()
+    file_name = file_name.split('/')[-1]
+    if file_ext not in WORD_EXTENTIONS and file_ext not in EXCEL_EXTENTIONS:
+        return None
+    out_object = f"{file_name}/{file_name}.md"
+    if file_ext == ".doc":
+        from processor.converters.file_converters import office_bytes_to_docx_bytes
+        # 先将 .doc 转换为 .docx
+        file_content = minio_tool.get_file_byte(bucket_name=bucket_name, object_name=obj)
+        docx_bytes = office_bytes_to_docx_bytes(file_content, suffix=file_ext)
+        temp_file_path = os.path.join(temp_dir, f"{uuid4().hex}.docx")
+        with open(temp_file_path, "wb") as temp_file:
+            temp_file.write(docx_bytes)
+        raw_markdown = doc_to_markdown(input_data=temp_file_path, task_id=file_name, bucket=output_bucket)
+        markdown_content = split_markdown(raw_markdown)
+    elif file_ext in WORD_EXTENTIONS:
+        temp_file_path = os.path.join(temp_dir, f"{uuid4().hex}{file_ext}")
+        with open(temp_file_path, "wb") as temp_file:
+            minio_tool.stream_to_file(bucket_name, obj, temp_file)
+        raw_markdown = doc_to_markdown(input_data=temp_file_path, task_id=file_name, bucket=output_bucket)
+        markdown_content = split_markdown(raw_markdown)
+    else:
+        # 处理 Excel，包括 CSV
+        is_csv = (file_ext == ".csv")
+        temp_file_path = os.path.join(temp_dir, f"{uuid4().hex}{file_ext}")
+        with open(temp_file_path, "wb") as temp_file:
+            minio_tool.stream_to_file(bucket_name, obj, temp_file)
+        # 逐段编码并分片上传，不再拼接出完整的字符串和字节副本
+        minio_tool.upload_file_by_stream(
+            bucket_name=output_bucket,
+            object_name=out_object,
+            stream=GeneratorStream(excel_to_markdown(
+                excel_content=temp_file_path,
+                file_name=file_name,
+                is_csv=is_csv,
+            )),
+            content_type='text/markdown; charset=utf-8'
+        )
+        return {"source": obj, "markdown_url": out_object}
+    markdown_bytes = markdown_content.encode('utf-8', errors='replace')
+    minio_tool.upload_file_by_bytes(
+        bucket_name=output_bucket,
+        object_name=out_object,
+        file_bytes=markdown_bytes,
+        content_type='text/markdown; charset=utf-8'
+    )
+    return {"source": obj, "markdown_url": out_object}
+
+
 @router.post("/analyze-office-dir")
-def analyze_office_dir(
+async def analyze_office_dir(
     dir_path: str,
     bucket_name: str,
     output_bucket: str,
@@ -148,60 +225,38 @@ def analyze_office_dir(
     fallback_chunk_size: int = 1024
 ):
     try:
-        objects = minio_tool.list_objects(bucket_name=bucket_name, prefix=dir_path, recursive=True)
+        # 目录前缀必须以 / 结尾，否则会匹配到同名前缀的其他目录
+        dir_path = as_dir_prefix(dir_path)
+        objects = await asyncio.to_thread(minio_tool.list_objects_concurrent, bucket_name=bucket_name, prefix=dir_path)
         if not objects:
             raise HTTPException(status_code=404, detail="目录下没有文件")
+
+        # 各文件相互独立，并发处理，用信号量限制同时运行的转换数量，避免同时拉起过多 LibreOffice 进程
+        semaphore = asyncio.Semaphore(route_settings.OFFICE_DIR_CONCURRENCY)
+
+        # 整个请求共用一个临时目录，所有中间文件在请求结束（包括异常）时统一清理
+        with tempfile.TemporaryDirectory() as temp_dir:
+            async def process_one(obj: str) -> Optional[dict]:
+                async with semaphore:
+                    return await asyncio.to_thread(_process_office_object, obj, bucket_name, output_bucket, temp_dir)
+
+            # return_exceptions=True：单个文件失败不会提前结束 gather，所有转换都结束后才离开 with 删除临时目录
+            processed = await asyncio.gather(*(process_one(obj) for obj in objects), return_exceptions=True)
         results = []
-        for obj in objects:
-            file_name, file_ext = os.path.splitext(obj)
-            file_name = file_name.split('/')[-1]
-            if (file_ext not in WORD_EXTENTIONS) and (file_ext not in EXCEL_EXTENTIONS) and (file_ext != ".doc"):
-                continue
-            file_content = minio_tool.get_file_byte(bucket_name=bucket_name, object_name=obj)
-            if file_ext == ".doc":
-                from processor.converters.file_converters import office_bytes_to_docx_bytes
-                # 先将 .doc 转换为 .docx
-                docx_bytes = office_bytes_to_docx_bytes(file_content, suffix=file_ext)
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as temp_file:
-                    temp_file.write(docx_bytes)
-                    temp_file_path = temp_file.name
-                raw_markdown = doc_to_markdown(input_data=temp_file_path, task_id=file_name, bucket=output_bucket)
-                raw_markdown = ensure_utf8_string(raw_markdown)
-                markdown_content = split_markdown(raw_markdown)
-                os.remove(temp_file_path)
-            elif file_ext in WORD_EXTENTIONS:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-                    temp_file.write(file_content)
-                    temp_file_path = temp_file.name
-                raw_markdown = doc_to_markdown(input_data=temp_file_path, task_id=file_name, bucket=output_bucket)
-                raw_markdown = ensure_utf8_string(raw_markdown)
-                markdown_content = split_markdown(raw_markdown)
-                os.remove(temp_file_path)
-            else:
-                # 处理 Excel，包括 CSV
-                is_csv = (file_ext.lower() == ".csv")
-                with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-                    temp_file.write(file_content)
-                    temp_file_path = temp_file.name
-                markdown_content = ''.join(excel_to_markdown(
-                    excel_content=temp_file_path,
-                    file_name=file_name,
-                    is_csv=is_csv,
-                ))
-                os.remove(temp_file_path)
-            markdown_content = ensure_utf8_string(markdown_content)
-            markdown_bytes = markdown_content.encode('utf-8')
-            out_object = f"{file_name}/{file_name}.md"
-            minio_tool.upload_file_by_bytes(
-                bucket_name=output_bucket,
-                object_name=out_object,
-                file_bytes=markdown_bytes,
-                content_type='text/markdown; charset=utf-8'
-            )
-            results.append({"source": obj, "markdown_url": out_object})
+        failed = 0
+        for obj, result in zip(objects, processed, strict=True):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error(f"处理目录 {dir_path} 下的文件 {obj} 失败: {result}")
+                results.append({"source": obj, "error": str(result)})
+            elif result is not None:
+                results.append(result)
+        message = f"共处理 {len(results) - failed} 个文件"
+        if failed:
+            message += f"，{failed} 个文件处理失败"
         return {
             "status": "success",
-            "message": f"共处理 {len(results)} 个文件",
+            "message": message,
             "data": results
         }
     except S3Error as e:
@@ -226,44 +281,47 @@ def upload_analyze_office_file(
 ):
     try:
         file_name, file_ext = os.path.splitext(file.filename)
+        file_ext = file_ext.lower()
         markdown_content = ""
+        md_chunks = None
 
         if file_ext in WORD_EXTENTIONS:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-                tmp.write(file.file.read())
-                tmp_path = tmp.name  # 临时文件路径
-            # 分析word文档
+            with tempfile.TemporaryDirectory() as temp_dir:
+                tmp_path = os.path.join(temp_dir, f"{uuid4().hex}{file_ext}")  # 临时文件路径
+                with open(tmp_path, "wb") as tmp:
+                    # 分块复制上传内容，内存占用与上传文件大小无关
+                    shutil.copyfileobj(file.file, tmp, length=1 << 20)
+                # 分析word文档
                 # 获取markdown内容
                 raw_markdown = doc_to_markdown(
                     input_data=tmp_path,  # 传本地路径
                     task_id=file_name,
                     bucket="output"
                 )
-                raw_markdown = ensure_utf8_string(raw_markdown)
                 markdown_content = split_markdown(raw_markdown)
-            os.remove(tmp_path)
         elif file_ext in EXCEL_EXTENTIONS:
-            markdown_content = ''.join(excel_to_markdown(
+            # 直接把转换结果逐段交给响应输出，不再拼接成完整字符串
+            md_chunks = excel_to_markdown(
                 excel_content=file.file,
                 file_name=file_name,
                 is_csv=file_ext == '.csv',
                 header_row_number=header_row_number,
                 key_columns=key_columns
-            ))
+            )
         else:
             raise HTTPException(status_code=400, detail="不支持的文件类型")
 
-        # 将 Markdown 内容写到内存中
-        markdown_content = ensure_utf8_string(markdown_content)
-        markdown_bytes = markdown_content.encode('utf-8')
-        md_bytes = io.BytesIO(markdown_bytes)
-        md_bytes.seek(0)
+        if md_chunks is None:
+            # 将 Markdown 内容写到内存中
+            markdown_bytes = markdown_content.encode('utf-8', errors='replace')
+            md_chunks = io.BytesIO(markdown_bytes)
+            md_chunks.seek(0)
 
         # 直接返回内存文件
         content_disposition = safe_filename_for_header(f"{file_name}.md")
         
         return StreamingResponse(
-            md_bytes,
+            md_chunks,
             media_type="text/markdown",
             headers={
                 "Content-Disposition": content_disposition
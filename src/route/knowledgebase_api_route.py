@@ -4,38 +4,39 @@ knowledgebase_api_route.py
 知识库API路由，提供批量文件分析接口。
 """
 
+import asyncio
 from typing import Optional, List
 from const.file_extensions import WORD_EXTENTIONS, EXCEL_EXTENTIONS
 from .handlers.response_handler import create_success_response,BaseResponse,create_payload_too_large_response
 from .handlers.authentication import api_key_required
 import os
 import tempfile
+from uuid import uuid4
 from datetime import datetime
 from processor.converters.excel_to_markdown import excel_to_markdown
 from processor.converters.doc_to_markdown import doc_to_markdown
 from processor.markdown_splitter import process_markdown as split_markdown
+from processor.markdown_cache import new_content_hasher, markdown_cache_object, has_cached_markdown
 from pydantic import BaseModel, Field
-from fastapi import APIRouter, BackgroundTasks
+from loguru import logger
+from fastapi import APIRouter
 from minio.error import S3Error
 from const.ocr_lang_enum import OCRLanguage
 from data.model import Task
 from utils.id_generator import generate_short_uuid
 from const.task_status_enum import TaskStatus
-from processor.tasking.pdf_task import process_pdf_task
+from celery_worker.celery_server import DEFAULT_QUEUE_NAME, get_queue_length, send_pdf_tasks_bulk
 from startup import task_repository,minio_tool
+from route.route_config import route_settings
+from utils.minio_tool import GeneratorStream
 
 # 实例化资源，添加统一前缀
 router = APIRouter(prefix="/knowledgebase")
-# 最大同时处理的任务数
-MAX_WORKERS = int(os.getenv('MAX_WORKERS', 8))
-# 最大排队任务数
-MAX_QUEUING_TASKS = int(os.getenv('MAX_QUEUING_TASKS', 20))
-# 默认知识库存储桶
-DEFAULT_KNOWLEDGEBASE_BUCKET = os.getenv('DEFAULT_KNOWLEDGEBASE_BUCKET', 'xt-0116')
 
 class PDFResponseInfo(BaseModel):
     fileId:str = Field(..., description="文件唯一标识", example="file_123")
     taskId:str = Field(..., description="任务唯一标识", example="task_123")
+    message: Optional[str] = Field(None, description="任务提交结果说明，投递失败时给出原因", example="")
 
 class TaskStatusResponse(BaseModel):
     """批量获取任务状态响应模型"""
@@ -85,8 +86,8 @@ def analyze_document_files(
         try:
             result = process_single_file(
                 file_info=file_info,
-                bucket_name=DEFAULT_KNOWLEDGEBASE_BUCKET,
-                output_bucket=DEFAULT_KNOWLEDGEBASE_BUCKET,
+                bucket_name=route_settings.DEFAULT_KNOWLEDGEBASE_BUCKET,
+                output_bucket=route_settings.DEFAULT_KNOWLEDGEBASE_BUCKET,
                 max_paragraph_length=request.paragraphMaxLength or 1000,
                 preserve_smart_tags=request.preserveSmartTags or True
             )
@@ -109,41 +110,63 @@ def analyze_document_files(
 @router.post("/analyze-pdf")
 @api_key_required
 async def analyze_pdf(
-    background_tasks: BackgroundTasks, 
     request: BatchAnalyzeRequest
 ) -> BatchPDFAnalyzeResponse:
     """
     分析PDF文件的接口
+    任务投递到 Celery 队列，由独立的 worker 进程处理，API 进程不再承担 PDF 解析的 CPU 负载
     """
-    # 第一步：检查系统负载，如果活动任务数量超过最大值，直接返回错误
-    if task_repository.count_active_task() >= MAX_QUEUING_TASKS:
+    # 第一步：检查系统负载，如果队列中等待的任务数量超过最大值，直接返回错误
+    # 队列长度只查询一次，循环内在本地累加
+    target_queue = DEFAULT_QUEUE_NAME
+    queued = await asyncio.to_thread(get_queue_length, target_queue)
+    if queued >= route_settings.KNOWLEDGEBASE_MAX_QUEUING_TASKS:
         return create_payload_too_large_response(
-            message=f"系统繁忙，当前队列已满（{MAX_QUEUING_TASKS}个任务），请稍后再试"
+            message=f"系统繁忙，当前队列已满（{route_settings.KNOWLEDGEBASE_MAX_QUEUING_TASKS}个任务），请稍后再试"
         )
     
     results: List[PDFResponseInfo] = []
+    tasks_to_add: List[Task] = []
     if len(request.ossInfo) > 10:
         # 传入的文件过多
         return create_payload_too_large_response(message="传入的文件过多，最多支持10个文件")
+    # 先批量检查文件是否存在，每个目录只列举一次
+    try:
+        existing = await asyncio.to_thread(
+            minio_tool.existing_objects,
+            route_settings.DEFAULT_KNOWLEDGEBASE_BUCKET,
+            [file_info.ossName for file_info in request.ossInfo]
+        )
+    except Exception as e:
+        # existing_objects 在列举失败时抛出异常（S3Error 或 MinIO 不可达时的连接错误），按存储错误返回，而不是报告文件不存在
+        logger.error(f"检查知识库文件失败: {e}")
+        return create_success_response(
+            data=[PDFResponseInfo(fileId=file_info.fileId, taskId="", message=str(e)) for file_info in request.ossInfo],
+            message=f"检查文件失败: {e}"
+        )
+    queue_full = False
     for file_info in request.ossInfo:
-        # 先检查是否存在文件
-        try:
-            minio_tool.file_exists(bucket_name=DEFAULT_KNOWLEDGEBASE_BUCKET, object_name=file_info.ossName)
-        except S3Error as e:
+        if file_info.ossName not in existing:
             results.append(PDFResponseInfo(
                 fileId=file_info.fileId,
                 taskId="",
-                message=str(e)
+                message="文件不存在"
             ))
             continue
 
+        # 检查队列状态，并发处理数由 Celery worker 的并发度控制
+        if queued >= route_settings.KNOWLEDGEBASE_MAX_QUEUING_TASKS:
+            queue_full = True
+            break
+        queued += 1
+
         task_id = generate_short_uuid()
         
         task_to_add = Task(
             task_id=task_id,
             object_key=file_info.ossName,
-            bucket_name=DEFAULT_KNOWLEDGEBASE_BUCKET,
-            output_bucket=DEFAULT_KNOWLEDGEBASE_BUCKET,
+            bucket_name=route_settings.DEFAULT_KNOWLEDGEBASE_BUCKET,
+            output_bucket=route_settings.DEFAULT_KNOWLEDGEBASE_BUCKET,
             ocr_enabled=True,
             table_enabled=True,
             formula_enabled=True,
@@ -151,28 +174,42 @@ async def analyze_pdf(
             output_info='',
             create_time=datetime.now(),
             finish_time=None,
+            status=TaskStatus.QUEUED,
         )
+        tasks_to_add.append(task_to_add)
 
-        # 先创建任务响应对象
+        # 创建任务响应对象
         result_info = PDFResponseInfo(
             fileId=file_info.fileId,
             taskId=task_id,
             message=""
         )
         results.append(result_info)
-        
-        # 然后检查队列状态
-        if task_repository.count_processing_task() < MAX_WORKERS:
-            active_task.status = TaskStatus.PROCESSING
-        elif task_repository.count_active_task() >= MAX_QUEUING_TASKS:
-            return create_success_response(
-                data=results, 
-                message=f"队列已满，成功生成{len(results)}份文档处理任务，剩余文件请稍后处理"
-            )
-        task_repository.create_task(task_to_add)
-        active_task = task_repository.create_active_task(active_task)
-        background_tasks.add_task(process_pdf_task, task_to_add)
 
+    # 所有任务在一个事务内批量写入，再统一投递到 Celery 队列
+    unsent = set()
+    if tasks_to_add:
+        await asyncio.to_thread(task_repository.create_tasks, tasks_to_add)
+        task_ids = [task.task_id for task in tasks_to_add]
+        sent_ids = await asyncio.to_thread(send_pdf_tasks_bulk, task_ids, target_queue)
+        if len(sent_ids) < len(task_ids):
+            # broker 中途不可用：未派发的任务标记为失败，并在结果中注明
+            unsent = set(task_ids[len(sent_ids):])
+            await asyncio.to_thread(task_repository.fail_tasks, unsent)
+            for result_info in results:
+                if result_info.taskId in unsent:
+                    result_info.message = "任务投递失败，请稍后重试"
+
+    if unsent:
+        return create_success_response(
+            data=results,
+            message=f"成功生成{len(tasks_to_add) - len(unsent)}份文档处理任务，{len(unsent)}份任务投递失败，请稍后重试"
+        )
+    if queue_full:
+        return create_success_response(
+            data=results, 
+            message=f"队列已满，成功生成{len(tasks_to_add)}份文档处理任务，剩余文件请稍后处理"
+        )
     return create_success_response(data=results,message=f"成功生成{len(results)}份pdf文档处理任务")
 
 @router.post("/batch-task-status", response_model=BatchTaskStatusResponse)
@@ -184,18 +221,19 @@ async def get_batch_task_status(taskIds: List[str]) -> BatchTaskStatusResponse:
     :return: 包含所有任务状态的列表
     """
     results = []
+    # 一次 IN 查询取回所有任务，数据库查询是阻塞调用，放到线程中执行，避免阻塞事件循环
+    tasks = await asyncio.to_thread(task_repository.get_tasks_by_ids, taskIds)
     
     for task_id in taskIds:
-        active_task = task_repository.get_active_task(task_id)
-        if active_task:
+        task = tasks.get(task_id)
+        if task and task.status in (TaskStatus.QUEUED, TaskStatus.PROCESSING):
             results.append(TaskStatusResponse(
-                taskId=active_task.task_id,
-                status=active_task.status,
-                message="任务正在处理" if active_task.status == TaskStatus.PROCESSING else "任务已加入队列"
+                taskId=task.task_id,
+                status=task.status,
+                message="任务正在处理" if task.status == TaskStatus.PROCESSING else "任务已加入队列"
             ))
             continue
             
-        task = task_repository.get_task_by_id(task_id)
         if task:
             results.append(TaskStatusResponse(
                 taskId=task.task_id,
@@ -230,32 +268,9 @@ def process_single_file(
         
         # 获取文件扩展名
         _, file_ext = os.path.splitext(file_info.ossName)
+        file_ext = file_ext.lower()
         
-        # 获取文件的字节流
-        file_content = minio_tool.get_file_byte(
-            bucket_name=bucket_name, 
-            object_name=file_info.ossName
-        )
-        
-        markdown_content = ""
-        
-        if file_ext in WORD_EXTENTIONS:
-            # 分析word文档
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
-                markdown_content = split_markdown(
-                    doc_to_markdown(
-                        input_data=temp_file_path,
-                        task_id=file_info.fileId,
-                        bucket=output_bucket
-                    ),
-                    max_length=max_paragraph_length
-                )
-        elif file_ext in EXCEL_EXTENTIONS:
-            # 分析excel文件
-            markdown_content = ''.join(excel_to_markdown(file_content))
-        else:
+        if file_ext not in WORD_EXTENTIONS and file_ext not in EXCEL_EXTENTIONS:
             return FileInfo(
                 fileId=file_info.fileId,
                 ossName="不支持的文件类型"
@@ -264,14 +279,49 @@ def process_single_file(
         # 生成输出文件名，使用当日日期
         current_date = datetime.now().strftime("%Y%m%d")
         output_filename = f"{current_date}/{file_info.fileId}.md"
-        
-        # 上传到minio
-        minio_tool.upload_file_by_bytes(
+
+        # 中间文件放在临时目录中，处理结束（包括异常）后随目录一起清理
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # 将对象流式写入临时文件，不在内存中保留完整的文件字节
+            # 下载的同时计算内容摘要，相同内容（且切分参数相同）的文件直接复用之前的转换结果
+            temp_file_path = os.path.join(temp_dir, f"{uuid4().hex}{file_ext}")
+            hasher = new_content_hasher()
+            with open(temp_file_path, "wb") as temp_file:
+                minio_tool.stream_to_file(bucket_name, file_info.ossName, temp_file, hasher)
+
+            # Word 转换结果中的图片链接指向以 fileId 命名的目录，缓存键需包含该目录
+            cache_params = (max_paragraph_length, file_info.fileId) if file_ext in WORD_EXTENTIONS else (max_paragraph_length,)
+            cache_object = markdown_cache_object(hasher, *cache_params)
+            if has_cached_markdown(minio_tool, output_bucket, cache_object):
+                minio_tool.copy_file(output_bucket, cache_object, output_filename)
+                return FileInfo(
+                    fileId=file_info.fileId,
+                    ossName=output_filename
+                )
+
+            if file_ext in WORD_EXTENTIONS:
+                # 分析word文档
+                markdown_chunks = [split_markdown(
+                    doc_to_markdown(
+                        input_data=temp_file_path,
+                        task_id=file_info.fileId,
+                        bucket=output_bucket
+                    ),
+                    max_length=max_paragraph_length
+                )]
+            else:
+                # 分析excel文件，保留分段结果，上传时逐段编码
+                markdown_chunks = excel_to_markdown(temp_file_path)
+
+        # 流式上传到minio，不再拼接出完整的字符串和字节副本
+        if minio_tool.upload_file_by_stream(
             bucket_name=output_bucket, 
             object_name=output_filename, 
-            file_bytes=markdown_content.encode('utf-8'),
+            stream=GeneratorStream(markdown_chunks),
             content_type='text/markdown'
-        )
+        ):
+            # 写入缓存
+            minio_tool.copy_file(output_bucket, output_filename, cache_object)
         
         # 返回处理成功的FileInfo对象，ossName字段包含生成的markdown文件路径
         return FileInfo(
@@ -4,6 +4,7 @@ pdf_route.py
 定义 PDF 相关的接口路由，包括分析 PDF 接口和查询任务状态接口。
 """
 
+import asyncio
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 from datetime import datetime
@@ -13,6 +14,8 @@ from data.model import Task
 from utils.id_generator import generate_short_uuid
 from const.task_status_enum import TaskStatus
 from startup import task_repository,minio_tool
+from utils.minio_tool import as_dir_prefix
+from route.route_config import route_settings
 from fastapi import UploadFile, File
 from typing import List
 # 为了让接口返回压缩包
@@ -20,19 +23,148 @@ import zipfile
 from loguru import logger
 import os
 from fastapi.responses import StreamingResponse
-from io import BytesIO
-import zipfile
-from celery_worker.celery_server import DEFAULT_QUEUE_NAME, get_queue_length, send_pdf_task
+import json
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from celery_worker.celery_server import DEFAULT_QUEUE_NAME, get_queue_length, send_pdf_task, send_pdf_tasks_bulk
 from const.file_extensions import OFFICE_EXTENSIONS, PDF_EXTENSIONS, IMAGE_EXTENSIONS,EXCEL_EXTENTIONS
 
 # 实例化资源
 router = APIRouter()
-MAX_WORKERS = int(os.getenv('MAX_WORKERS', 8))
-MAX_QUEUING_TASKS = int(os.getenv('MAX_QUEUING_TASKS', 40))
-UPLOAD_BUCKET = os.getenv('UPLOAD_BUCKET', 'uploads')
+# drop_pdf 可处理的文件扩展名
+DROP_PDF_ALLOWED_EXTENSIONS = PDF_EXTENSIONS | IMAGE_EXTENSIONS | OFFICE_EXTENSIONS | EXCEL_EXTENTIONS
+# 打包下载时从 MinIO 读取对象的分块大小
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+# 打包下载时提前发起的对象请求数，用于掩盖逐个 GET 的往返延迟
+DOWNLOAD_FETCH_CONCURRENCY = int(os.getenv("DOWNLOAD_FETCH_CONCURRENCY", "16"))
+# 打包下载时需要压缩的文本类文件，图片、PDF 等已压缩格式直接存储，省去无效的压缩开销
+ZIP_COMPRESSIBLE_EXTENSIONS = frozenset({'.txt', '.json', '.md', '.csv', '.xml', '.html'})
+
+
+class _ZipSink:
+    """
+    供 ZipFile 写入的不可 seek 缓冲，写入的数据在每次 drain 时取走
+    ZipFile 在不可 seek 的输出上会改用数据描述符记录大小，因此可以边压缩边输出
+    """
+    def __init__(self):
+        self._buf = []
+
+    def write(self, data) -> int:
+        self._buf.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._buf)
+        self._buf.clear()
+        return data
+
+
+def _zip_entry_info(object_name: str) -> zipfile.ZipInfo:
+    """
+    根据扩展名为压缩包条目选择压缩方式：文本类 DEFLATED，其余 STORED
+    """
+    info = zipfile.ZipInfo(object_name)
+    if os.path.splitext(object_name)[-1].lower() in ZIP_COMPRESSIBLE_EXTENSIONS:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    else:
+        info.compress_type = zipfile.ZIP_STORED
+    return info
+
+
+def _iter_zip_from_minio(bucket_name: str, object_names: List[str]):
+    """
+    从 MinIO 流式读取对象并压缩，边压缩边产出 zip 数据块，不在内存中保留完整文件或压缩包
+    后续对象的 GET 请求在线程池中提前发起（最多 DOWNLOAD_FETCH_CONCURRENCY 个），
+    压缩仍按顺序在当前线程进行
+    """
+    sink = _ZipSink()
+    names = iter(object_names)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_FETCH_CONCURRENCY) as pool:
+        def prefetch():
+            object_name = next(names, None)
+            if object_name is not None:
+                pending.append((object_name, pool.submit(minio_tool.get_file_stream, bucket_name, object_name)))
+
+        try:
+            for _ in range(DOWNLOAD_FETCH_CONCURRENCY):
+                prefetch()
+            with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                while pending:
+                    object_name, future = pending.popleft()
+                    prefetch()
+                    with zipf.open(_zip_entry_info(object_name), 'w') as entry:
+                        for chunk in minio_tool.iter_response(future.result(), ZIP_STREAM_CHUNK_SIZE):
+                            entry.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                    data = sink.drain()
+                    if data:
+                        yield data
+            # 中央目录在 ZipFile 关闭时写出
+            data = sink.drain()
+            if data:
+                yield data
+        finally:
+            # 客户端中途断开时，归还已提前打开的连接
+            for object_name, future in pending:
+                try:
+                    response = future.result()
+                    response.close()
+                    response.release_conn()
+                except Exception as e:
+                    logger.debug(f"关闭提前打开的对象连接失败: {object_name}, 异常: {e}")
+
+
+def _stream_task_zip(task_id: str, first_chunk: bytes, rest):
+    """
+    先发送已生成的第一个数据块，再继续迭代剩余部分
+    响应状态码此时已经发出，中途失败只能中断传输，这里记录任务号便于排查
+    """
+    try:
+        yield first_chunk
+        yield from rest
+    except Exception as e:
+        logger.error(f"任务 {task_id} 的压缩包在传输过程中失败，客户端收到的压缩包不完整: {e}")
+        raise
+    finally:
+        rest.close()
+
+
+def _filter_droppable_objects(object_names) -> List[str]:
+    """
+    过滤掉目录占位对象和不支持的文件类型，单次遍历完成去重，返回排序后的对象名称
+    """
+    return sorted({
+        obj for obj in object_names
+        if not obj.endswith('/') and os.path.splitext(obj)[-1].lower() in DROP_PDF_ALLOWED_EXTENSIONS
+    })
+
+
+def _list_droppable_objects(bucket_name: str, prefix: str):
+    """
+    惰性列举前缀下的对象并边列举边过滤，不保留完整的原始列表
+    :return: (是否列举到任何对象, 过滤后的对象名称列表)
+    """
+    listed = False
+
+    def names():
+        nonlocal listed
+        for name in minio_tool.iter_objects(bucket_name=bucket_name, prefix=prefix, recursive=True):
+            listed = True
+            yield name
+
+    objects = _filter_droppable_objects(names())
+    return listed, objects
+
 
 @router.post("/drop-pdf")
-def drop_pdf(
+async def drop_pdf(
     pdf_path: str,
     bucket_name: str,
     output_bucket: str,
@@ -47,50 +179,57 @@ def drop_pdf(
     若前缀为空但 pdf_path 指向单个对象存在，则仅为该对象创建任务。
     """
     try:
-        objects = minio_tool.list_objects(bucket_name=bucket_name, prefix=pdf_path, recursive=True)
-        if not objects:
-            if not minio_tool.file_exists(bucket_name=bucket_name, object_name=pdf_path):
+        # 先按目录列举（前缀补齐 "/"），为空时再按单个对象处理
+        listed, objects = await asyncio.to_thread(_list_droppable_objects, bucket_name, as_dir_prefix(pdf_path))
+        if not listed:
+            if not await asyncio.to_thread(minio_tool.object_exists, bucket_name, pdf_path):
                 raise HTTPException(status_code=404, detail="路径下没有文件或文件不存在")
-            objects = [pdf_path]
-
-        # 因为minio中可能会有目录作为文件存在，所有需要过滤掉目录和不支持的文件类型
-        # 并且也对重复的文件进行去重
-        allowed_exts = {*PDF_EXTENSIONS, *IMAGE_EXTENSIONS, *OFFICE_EXTENSIONS,*EXCEL_EXTENTIONS}
-        objects = [obj for obj in objects if not obj.endswith('/') and os.path.splitext(obj)[-1].lower() in allowed_exts]
-        objects = sorted(set(objects))
+            objects = _filter_droppable_objects([pdf_path])
         if not objects:
             raise HTTPException(status_code=404, detail="路径下没有可处理的文件")
 
         target_queue = DEFAULT_QUEUE_NAME
-        backlog = get_queue_length(target_queue)
-        if backlog >= MAX_QUEUING_TASKS:
+        backlog = await asyncio.to_thread(get_queue_length, target_queue)
+        if backlog >= route_settings.MAX_QUEUING_TASKS:
             return JSONResponse(content={
                 "task_id": "",
                 "status": TaskStatus.QUEUED,
                 "message": f"队列压力过大({target_queue}:{backlog})，请稍后重试"
             }, status_code=429)
 
-        task_ids = []
-        for obj in objects:
-            task_id = generate_short_uuid()
-            task_to_add = Task(
-                task_id=task_id,
-                object_key=obj,
-                bucket_name=bucket_name,
-                output_bucket=output_bucket,
-                ocr_enabled=ocr_enabled,
-                table_enabled=table_enabled,
-                formula_enabled=formula_enabled,
-                inline_formula_enabled=inline_formula_enabled,
-                ocr_lang=ocr_lang.value,
-                output_info='',
-                create_time=datetime.now(),
-                finish_time=None,
-                status=TaskStatus.QUEUED,
-            )
-            task_repository.create_task(task_to_add)
-            send_pdf_task(task_id, target_queue)
-            task_ids.append(task_id)
+        # 同一批任务除 task_id、object_key 外的字段都相同，创建时间也统一取一次
+        base_fields = dict(
+            bucket_name=bucket_name,
+            output_bucket=output_bucket,
+            ocr_enabled=ocr_enabled,
+            table_enabled=table_enabled,
+            formula_enabled=formula_enabled,
+            inline_formula_enabled=inline_formula_enabled,
+            ocr_lang=ocr_lang.value,
+            output_info='',
+            create_time=datetime.now(),
+            finish_time=None,
+            status=TaskStatus.QUEUED,
+        )
+        task_ids = [generate_short_uuid() for _ in objects]
+        tasks_to_add = [
+            Task(task_id=task_id, object_key=obj, **base_fields)
+            for task_id, obj in zip(task_ids, objects, strict=True)
+        ]
+        # 所有任务在一个事务内批量写入，再通过同一条 broker 连接统一投递
+        await asyncio.to_thread(task_repository.create_tasks, tasks_to_add)
+        sent_ids = await asyncio.to_thread(send_pdf_tasks_bulk, task_ids, target_queue)
+        if len(sent_ids) < len(task_ids):
+            # broker 中途不可用：未派发的任务标记为失败，只返回已入队的任务
+            await asyncio.to_thread(task_repository.fail_tasks, task_ids[len(sent_ids):])
+            return JSONResponse(content={
+                "task_ids": sent_ids,
+                "status": TaskStatus.QUEUED,
+                "message": f"队列暂不可用，已入队 {len(sent_ids)}/{len(task_ids)} 个任务，请稍后重试其余文件",
+                "queue": target_queue,
+                "backlog": backlog,
+                "count": len(sent_ids)
+            }, status_code=429)
 
         logger.info(f"路径 {pdf_path} 下共 {len(objects)} 个文件已入队到 {target_queue}，当前等待数: {backlog}")
         return JSONResponse(content={
@@ -110,7 +249,7 @@ def drop_pdf(
 
 
 @router.post("/analyze-pdf")
-def analyze_pdf(
+async def analyze_pdf(
     pdf_path: str, 
     bucket_name: str, 
     output_bucket: str,
@@ -124,7 +263,7 @@ def analyze_pdf(
     分析PDF文件的接口（移除 ActiveTask 引用，保留本地 BackgroundTasks）
     """
     try:
-        minio_tool.file_exists(bucket_name=bucket_name, object_name=pdf_path)
+        await asyncio.to_thread(minio_tool.file_exists, bucket_name=bucket_name, object_name=pdf_path)
     except S3Error:
         raise HTTPException(status_code=404, detail="PDF文件未找到")
 
@@ -148,15 +287,15 @@ def analyze_pdf(
         )
 
 
-        if task_repository.count_active_task() >= MAX_QUEUING_TASKS:
+        if await asyncio.to_thread(task_repository.count_active_task) >= route_settings.MAX_QUEUING_TASKS:
             return JSONResponse(content={
                 "task_id": "",
                 "status": TaskStatus.FAILED,
                 "message": "队列已满，请稍后再试"
             })
 
-        task_repository.create_task(task_to_add)
-        send_pdf_task(task_id, DEFAULT_QUEUE_NAME)
+        await asyncio.to_thread(task_repository.create_task, task_to_add)
+        await asyncio.to_thread(send_pdf_task, task_id, DEFAULT_QUEUE_NAME)
 
         return JSONResponse(content={
             "task_id": task_id,
@@ -168,8 +307,21 @@ def analyze_pdf(
         raise HTTPException(status_code=429, detail=str(e))
 
 
+def _upload_object_name(task_id: str, filename: str) -> str:
+    """
+    生成上传文件的对象名；开启 UPLOAD_PREFIX_SHARDS 时在前面加上稳定的哈希分片前缀
+    分片前缀随对象名写入 Task.object_key，后续处理直接按 object_key 读取
+    """
+    shards = route_settings.UPLOAD_PREFIX_SHARDS
+    if shards <= 0:
+        return f"{task_id}/{filename}"
+    # 不用内置 hash()，其结果随进程随机化
+    shard = zlib.crc32(task_id.encode("utf-8")) % shards
+    return f"{shard:02x}/{task_id}/{filename}"
+
+
 @router.post("/upload-and-analyze-pdf")
-def upload_and_analyze_pdf(
+async def upload_and_analyze_pdf(
     output_bucket: str,
     file: UploadFile = File(...),
     ocr_enabled: bool = False,
@@ -183,26 +335,36 @@ def upload_and_analyze_pdf(
     """
     try:
         # 检查output_bucket是否存在
-        if not minio_tool.bucket_exists(output_bucket):
+        if not await asyncio.to_thread(minio_tool.bucket_exists, output_bucket):
             raise HTTPException(status_code=400, detail=f"输出存储桶{output_bucket}不存在")
-            
+
+        # 队列已满时直接返回，避免先上传大文件
+        if await asyncio.to_thread(task_repository.count_active_task) >= route_settings.MAX_QUEUING_TASKS:
+            return JSONResponse(content={
+                "task_id": "",
+                "status": TaskStatus.FAILED,
+                "message": "队列已满，请稍后再试"
+            })
+
         # 生成唯一任务ID
         task_id = generate_short_uuid()
         
         # 上传文件到MinIO
-        bucket_name = UPLOAD_BUCKET  # 可以配置为常量
-        object_name = f"{task_id}/{file.filename}"
-        # 读取文件内容为字节流
-        file_content = file.file.read()
+        bucket_name = route_settings.UPLOAD_BUCKET  # 可以配置为常量
+        object_name = _upload_object_name(task_id, file.filename)
         # 获取文件类型（默认为application/octet-stream）
         content_type = file.content_type or "application/octet-stream"
-        # 调用minio上传
-        minio_tool.upload_file_by_bytes(
-            bucket_name=bucket_name,
+        # 直接以上传文件的临时文件句柄分片上传，不把整个文件读入内存
+        uploaded = await asyncio.to_thread(
+            minio_tool.upload_file_by_stream,
             object_name=object_name,
-            file_bytes=file_content,
-            content_type=content_type
+            bucket_name=bucket_name,
+            stream=file.file,
+            content_type=content_type,
+            length=file.size if file.size is not None else -1
         )
+        if not uploaded:
+            raise HTTPException(status_code=500, detail=f"文件上传失败: {object_name}")
 
         # 创建任务
         task_to_add = Task(
@@ -221,15 +383,8 @@ def upload_and_analyze_pdf(
             status=TaskStatus.QUEUED,
         )
 
-        if task_repository.count_active_task() >= MAX_QUEUING_TASKS:
-            return JSONResponse(content={
-                "task_id": "",
-                "status": TaskStatus.FAILED,
-                "message": "队列已满，请稍后再试"
-            })
-
-        task_repository.create_task(task_to_add)
-        send_pdf_task(task_id, DEFAULT_QUEUE_NAME)
+        await asyncio.to_thread(task_repository.create_task, task_to_add)
+        await asyncio.to_thread(send_pdf_task, task_id, DEFAULT_QUEUE_NAME)
 
         return JSONResponse(content={
             "task_id": task_id,
@@ -241,11 +396,11 @@ def upload_and_analyze_pdf(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/task-status/{task_id}")
-def get_task_status(task_id: str):
+async def get_task_status(task_id: str):
     """
     获取任务状态接口（不再依赖 ActiveTask）
     """
-    active_task = task_repository.get_active_task(task_id)
+    active_task = await asyncio.to_thread(task_repository.get_active_task, task_id)
     if active_task:
         return JSONResponse(content={
             "task_id": active_task.task_id,
@@ -253,7 +408,7 @@ def get_task_status(task_id: str):
             "message": "任务正在处理" if active_task.status == TaskStatus.PROCESSING else "任务已加入队列"
         })
 
-    task = task_repository.get_task_by_id(task_id)
+    task = await asyncio.to_thread(task_repository.get_task_by_id, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
@@ -264,47 +419,56 @@ def get_task_status(task_id: str):
     })
 
 @router.get("/download-task-files/{task_id}", response_class=StreamingResponse)
-def download_task_files(task_id: str):
+async def download_task_files(task_id: str):
     try:
-        task = task_repository.get_task_by_id(task_id)
+        task = await asyncio.to_thread(task_repository.get_task_by_id, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="任务不存在")
         
         if not task.output_info:
             raise HTTPException(status_code=400, detail="任务尚未完成")
         
+        # output_info 以 JSON 字符串形式存储
         output_info = task.output_info
-
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_type, file_path in output_info.items():
-                if file_type == 'images':
-                    for img_path in file_path:
-                        img_data = minio_tool.get_file_byte(
-                            bucket_name=task.output_bucket,
-                            object_name=img_path
-                        )
-                        zipf.writestr(img_path, img_data)
-                else:
-                    file_data = minio_tool.get_file_byte(
-                        bucket_name=task.output_bucket,
-                        object_name=file_path
-                    )
-                    zipf.writestr(file_path, file_data)
-
-        zip_buffer.seek(0)
+        if isinstance(output_info, str):
+            output_info = json.loads(output_info)
+
+        object_names = []
+        for file_type, file_path in output_info.items():
+            if file_type == 'images':
+                object_names.extend(file_path)
+            else:
+                object_names.append(file_path)
+
+        # 响应头发出后就无法再返回错误状态码，所以开始传输前先确认所有对象都存在
+        existing = await asyncio.to_thread(minio_tool.existing_objects, task.output_bucket, object_names)
+        missing = [name for name in object_names if name not in existing]
+        if missing:
+            raise RuntimeError(f"结果文件不存在: {', '.join(missing[:5])}")
+
+        # 压缩包边读边压边发送，首字节无需等待整个压缩包生成
+        # 第一个数据块在返回响应前生成，首个对象的读取失败仍能以 500 返回
+        # 同步生成器由 StreamingResponse 放到线程池中迭代，压缩不会阻塞事件循环
+        zip_stream = _iter_zip_from_minio(task.output_bucket, object_names)
+        try:
+            first_chunk = await asyncio.to_thread(next, zip_stream, b"")
+        except Exception:
+            zip_stream.close()
+            raise
         return StreamingResponse(
-            zip_buffer,
+            _stream_task_zip(task_id, first_chunk, zip_stream),
             media_type="application/zip",
             headers={"Content-Disposition": f"attachment; filename={task_id}_files.zip"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"下载任务文件失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"下载失败: {str(e)}")
 
 
 @router.post("/reprocess-task/{task_id}")
-def reprocess_task(
+async def reprocess_task(
     task_id: str
 ):
     """
@@ -312,7 +476,7 @@ def reprocess_task(
     """
     try:
         # 获取原任务
-        task: Task = task_repository.get_task_by_id(task_id)
+        task: Task = await asyncio.to_thread(task_repository.get_task_by_id, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="任务不存在")
 
@@ -320,12 +484,12 @@ def reprocess_task(
         if task.finish_time is None:
             raise HTTPException(status_code=400, detail="任务尚未完成，无需重新处理")
         # 把任务放到celery队列中
-        send_pdf_task(task_id, DEFAULT_QUEUE_NAME)
+        await asyncio.to_thread(send_pdf_task, task_id, DEFAULT_QUEUE_NAME)
         
         # 重置原任务状态（可选）
         task.finish_time = None
         task.output_info = ''
-        task_repository.update_task(task)
+        await asyncio.to_thread(task_repository.update_task, task)
         # 这里直接返回加入队列
         # 尽管当前任务可能正在处理中
         return JSONResponse(content={
@@ -342,37 +506,43 @@ def reprocess_task(
 
 
 @router.post("/batch-task-status")
-def get_batch_task_status(task_ids: List[str]):
+async def get_batch_task_status(task_ids: List[str]):
     """
     批量获取任务状态接口
     :param task_ids: 任务ID列表
     :return: 包含所有任务状态的列表
     """
+    results = await asyncio.to_thread(_collect_batch_task_status, task_ids)
+    return JSONResponse(content=results)
+
+
+def _collect_batch_task_status(task_ids: List[str]) -> List[dict]:
+    """
+    一次 IN 查询取回整批任务，再按传入顺序组装状态，在工作线程中执行
+    活跃任务（QUEUED/PROCESSING）与已结束任务同在 Task 表中，按 status 区分
+    """
+    tasks = task_repository.get_tasks_by_ids(task_ids)
     results = []
     
     for task_id in task_ids:
-        active_task = task_repository.get_active_task(task_id)
-        if active_task:
+        task = tasks.get(task_id)
+        if task is None:
             results.append({
-                "task_id": active_task.task_id,
-                "status": active_task.status,
-                "message": "任务正在处理" if active_task.status == TaskStatus.PROCESSING else "任务已加入队列"
+                "task_id": task_id,
+                "status": "not_found",
+                "message": "任务不存在"
             })
-            continue
-            
-        task = task_repository.get_task_by_id(task_id)
-        if task:
+        elif task.status in (TaskStatus.QUEUED, TaskStatus.PROCESSING):
             results.append({
                 "task_id": task.task_id,
-                "status": TaskStatus.COMPLETED,
-                "result": task.output_info
+                "status": task.status,
+                "message": "任务正在处理" if task.status == TaskStatus.PROCESSING else "任务已加入队列"
             })
         else:
             results.append({
-                "task_id": task_id,
-                "status": "not_found",
-                "message": "任务不存在"
+                "task_id": task.task_id,
+                "status": TaskStatus.COMPLETED,
+                "result": task.output_info
             })
     
-    return JSONResponse(content=results)
-        
+    return results
@@ -0,0 +1,41 @@
+"""
+路由配置模块
+
+集中管理各路由模块使用的配置项，在导入时从环境变量读取一次并固定下来：
+- 上传/知识库存储桶及上传对象的前缀分片
+- 任务并发与排队上限
+- 目录批量分析并发数
+- 原文搜索结果缓存参数
+"""
+from dataclasses import dataclass
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+@dataclass(frozen=True)
+class RouteSettings:
+    """
+    路由配置类，实例创建后不可修改
+    """
+    # 上传文件使用的存储桶
+    UPLOAD_BUCKET: str = os.getenv("UPLOAD_BUCKET", "uploads")
+    # 上传对象按 task_id 哈希分散到的前缀数量，0 表示不分片（对象名为 {task_id}/{文件名}）
+    # 后端对单一前缀有写入限速（如 S3）时开启，避免按时间生成的 task_id 集中在同一前缀下
+    UPLOAD_PREFIX_SHARDS: int = int(os.getenv("UPLOAD_PREFIX_SHARDS", "0"))
+    # 最大同时处理的任务数
+    MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", "8"))
+    # 最大排队任务数
+    MAX_QUEUING_TASKS: int = int(os.getenv("MAX_QUEUING_TASKS", "40"))
+    # 知识库接口的最大排队任务数（与 MAX_QUEUING_TASKS 共用环境变量，默认值更保守）
+    KNOWLEDGEBASE_MAX_QUEUING_TASKS: int = int(os.getenv("MAX_QUEUING_TASKS", "20"))
+    # 默认知识库存储桶
+    DEFAULT_KNOWLEDGEBASE_BUCKET: str = os.getenv("DEFAULT_KNOWLEDGEBASE_BUCKET", "xt-0116")
+    # 目录批量分析时同时处理的文件数
+    OFFICE_DIR_CONCURRENCY: int = int(os.getenv("OFFICE_DIR_CONCURRENCY", "8"))
+    # 搜索结果缓存：条目上限与过期时间（秒）
+    SEARCH_CACHE_SIZE: int = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+    SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+
+route_settings = RouteSettings()
@@ -1,17 +1,40 @@
 import os
-from typing import Optional
+import functools
 from loguru import logger
-import threading
-import torch
 
-try:
-    import torch_npu
-    _HAS_TORCH_NPU = True
-except ImportError:
-    _HAS_TORCH_NPU = False
+# torch 体积大、导入慢，只在真正需要检测硬件时才导入
+# 不需要加速设备的进程（如 API 服务）可设置 DEVICE_MODE=cpu，完全跳过 torch 导入
 
-_DEVICE_CACHE: Optional[str] = None
-_LOCK = threading.Lock()
+
+@functools.cache
+def _torch():
+    """
+    延迟导入 torch，同时尝试导入 torch_npu 以注册 torch.npu
+    :return: (torch 模块, 是否可用 torch_npu)
+    """
+    import torch
+    try:
+        import torch_npu  # noqa: F401
+        has_torch_npu = True
+    except ImportError:
+        has_torch_npu = False
+    return torch, has_torch_npu
+
+
+def _device_from_env():
+    """
+    读取环境变量 DEVICE_MODE（cuda/npu/mps/cpu，可带索引），为 auto 或未设置时返回 None
+    cuda/npu 未指定索引时与自动检测一致，使用索引 0
+    """
+    mode = os.getenv("DEVICE_MODE", "auto").strip().lower()
+    device_type = mode.split(":")[0]
+    if device_type in ("cuda", "npu"):
+        return mode if ":" in mode else f"{mode}:0"
+    if device_type in ("mps", "cpu"):
+        return device_type
+    if device_type != "auto":
+        logger.warning(f"环境变量 DEVICE_MODE='{mode}' 不合法，回退到自动检测")
+    return None
 
 def _detect_hardware() -> str:
     """
@@ -21,7 +44,8 @@ def _detect_hardware() -> str:
        因此每个进程看到的都是"私有"的设备，统一使用索引 0。
     2. 检测顺序：CUDA -> NPU -> MPS -> CPU。
     """
-    
+    torch, _HAS_TORCH_NPU = _torch()
+
     # 1. Detect CUDA (NVIDIA GPUs)
     if torch.cuda.is_available():
         # 获取可见设备的数量，用于日志记录
@@ -46,18 +70,16 @@ def _detect_hardware() -> str:
     logger.info("No hardware accelerator detected. Using 'cpu'.")
     return "cpu"
 
+@functools.cache
 def get_device() -> str:
     """
     获取当前环境的最佳计算设备。
     返回示例: 'cuda:0', 'npu:0', 'mps', 'cpu'
     备注：默认选择第一个可见设备的原因是给每个进程分配一个课件设备，所以无脑选择type:0是遵循我的设计逻辑的
+    结果由 functools.cache 缓存，首次调用后不再加锁或检测；检测本身无副作用，并发首调重复执行也无妨
+    设置了 DEVICE_MODE 时直接采用，不导入 torch
     """
-    global _DEVICE_CACHE
-    if _DEVICE_CACHE is None:
-        with _LOCK:
-            if _DEVICE_CACHE is None:
-                _DEVICE_CACHE = _detect_hardware()
-    return _DEVICE_CACHE
+    return _device_from_env() or _detect_hardware()
 
 def get_device_type() -> str:
     """
@@ -1,17 +1,25 @@
 import os
+import functools
 from typing import Optional
 from loguru import logger
-import threading
-import torch
 from const.devices_enums import device_type_values
-try:
-    import torch_npu
-    _HAS_TORCH_NPU = True
-except Exception:
-    _HAS_TORCH_NPU = False
 
-_DEVICE_CACHE: Optional[str] = None
-_LOCK = threading.Lock()
+# torch 只在自动检测时导入，显式指定 preferred 或 DEVICE_MODE 时不会加载
+
+
+@functools.cache
+def _torch():
+    """
+    延迟导入 torch，同时尝试导入 torch_npu 以注册 torch.npu
+    :return: (torch 模块, 是否可用 torch_npu)
+    """
+    import torch
+    try:
+        import torch_npu  # noqa: F401
+        has_torch_npu = True
+    except Exception:
+        has_torch_npu = False
+    return torch, has_torch_npu
 
 def _detect_device(preferred: Optional[str] = None) -> str:
     """
@@ -37,6 +45,7 @@ def _detect_device(preferred: Optional[str] = None) -> str:
 
     # 3. 自动检测逻辑 (优先级: CUDA > MPS > NPU > CPU)
     try:
+        torch, _HAS_TORCH_NPU = _torch()
         if torch.cuda.is_available():
             logger.info("自动检测到 CUDA 设备，启用 GPU 加速")
             return "cuda"
@@ -53,13 +62,10 @@ def _detect_device(preferred: Optional[str] = None) -> str:
     logger.info("未检测到专用加速设备，使用 CPU 进行推理")
     return "cpu"
 
+@functools.cache
 def get_device() -> str:
-    global _DEVICE_CACHE
-    if _DEVICE_CACHE is None:
-        with _LOCK:
-            if _DEVICE_CACHE is None:
-                _DEVICE_CACHE = _detect_device(None)
-    return _DEVICE_CACHE
+    # 检测结果由 functools.cache 缓存，首次调用后直接返回
+    return _detect_device(None)
 
 def select_device(preferred: Optional[str] = None) -> str:
     if preferred:
@@ -0,0 +1,14 @@
+import numpy as np
+
+
+def is_angle_batch(polys: np.ndarray) -> np.ndarray:
+    """
+    批量判断文本框是否倾斜，逻辑与 mineru.utils.ocr_utils.calculate_is_angle 一致：
+    对角线高度 p3.y - p1.y 不在左右两边平均高度的 0.8~1.2 倍之间即视为倾斜
+    :param polys: (N, 4, 2) 的四点坐标，顺序为左上、右上、右下、左下
+    :return: (N,) 的 bool 数组
+    """
+    p1, p2, p3, p4 = polys[:, 0], polys[:, 1], polys[:, 2], polys[:, 3]
+    height = ((p4[:, 1] - p1[:, 1]) + (p3[:, 1] - p2[:, 1])) / 2
+    diagonal_h = p3[:, 1] - p1[:, 1]
+    return ~((0.8 * height <= diagonal_h) & (diagonal_h <= 1.2 * height))
@@ -2,24 +2,29 @@ from loguru import logger
 import os
 import sys
 
+# 文件 sink 的日志级别：文件 sink 需要 enqueue 保证多进程安全，每条记录都要序列化后经队列转发，
+# 默认只落盘 WARNING 及以上，INFO 级别的请求日志只走控制台
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "WARNING")
+
 def setup_logger(
     log_dir="logs",
     level="INFO",
     rotation="1 day",       # 每天新文件
     retention="7 days",     # 日志保留7天
-    compression="zip"       # 自动压缩过期日志
+    compression="zip",      # 自动压缩过期日志
+    file_level=LOG_FILE_LEVEL
 ):
     os.makedirs(log_dir, exist_ok=True)
 
     logger.remove()  # 移除默认的 stdout sink
 
-    # 控制台 sink
-    logger.add(sys.stderr, level=level, colorize=True, backtrace=True, diagnose=True)
+    # 控制台 sink：同步写入，不经过队列
+    logger.add(sys.stderr, level=level, colorize=True, backtrace=True, diagnose=True, enqueue=False)
 
     # 文件 sink
     logger.add(
         os.path.join(log_dir, "app_{time:YYYY-MM-DD}.log"),
-        level=level,
+        level=file_level,
         rotation=rotation,
         retention=retention,
         compression=compression,
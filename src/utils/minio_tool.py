@@ -2,9 +2,67 @@ from fastapi import HTTPException
 from minio import Minio
 import os
 import io
+import shutil
+import posixpath
+import urllib3
+import certifi
+from typing import Iterable, Iterator
 from loguru import logger
 from minio.error import S3Error
+from minio.commonconfig import CopySource
 from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+# 未知长度流式上传时的分片大小（MinIO 要求不小于 5 MiB）
+STREAM_PART_SIZE = 5 * 1024 * 1024
+# 已知长度上传时的分片大小，超过该大小的对象走分片上传（minio 默认并行上传 3 个分片）
+UPLOAD_PART_SIZE = 16 * 1024 * 1024
+# 并发列举子目录时的线程数
+MINIO_LIST_WORKERS = int(os.getenv("MINIO_LIST_WORKERS", "16"))
+# MinIO 连接池：每个主机保持的连接数上限，需不小于并发访问 MinIO 的线程数，否则多出的连接用完即关闭
+MINIO_POOL_MAXSIZE = int(os.getenv("MINIO_POOL_MAXSIZE", "32"))
+# 分片列举时用于切分键空间的字符（按字典序排列），覆盖 ULID 任务 ID 及常见文件名首字符
+LIST_SHARD_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+# 前缀短于该长度时，find_files_by_pattern 改用分片并发列举
+LIST_SHARD_PREFIX_LEN = 4
+
+
+def as_dir_prefix(prefix: str) -> str:
+    """
+    把目录前缀规范为以 "/" 结尾，使列举只落在该目录下，而不是按字符串前缀扫描同名前缀的所有键
+    空前缀（整个桶）保持不变
+    """
+    prefix = prefix.lstrip("/")
+    if prefix and not prefix.endswith("/"):
+        prefix = f"{prefix}/"
+    return prefix
+
+
+class GeneratorStream(io.RawIOBase):
+    """
+    将逐段产出字符串/字节的迭代器包装为只读文件对象
+    读取时才按需编码下一段，避免先拼接成完整字符串再整体编码
+    """
+    def __init__(self, chunks: Iterable, encoding: str = "utf-8", errors: str = "replace"):
+        self._chunks: Iterator = iter(chunks)
+        self._encoding = encoding
+        self._errors = errors
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = chunk.encode(self._encoding, self._errors) if isinstance(chunk, str) else bytes(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
 
 class MinioConnection:
     '''
@@ -36,11 +94,24 @@ class MinioConnection:
         if not all([endpoint, access_key, secret_key]):
             raise RuntimeError("MinIO环境变量配置不完整，请检查 MINIO_ENDPOINT、ACCESS_KEY、SECRET_KEY、BUCKET_NAME")
 
+        # 显式指定连接池大小，并发请求复用 TCP/TLS 连接
+        # minio 默认的连接池每个主机只保留 10 个连接，并发上传/列举时会频繁重建连接
+        # 其余参数与 minio 默认的连接池保持一致
+        http_client = urllib3.PoolManager(
+            num_pools=16,
+            maxsize=MINIO_POOL_MAXSIZE,
+            block=False,
+            timeout=urllib3.Timeout(connect=300, read=300),
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        )
         self.client = Minio(
             endpoint=endpoint,
             access_key=access_key,
             secret_key=secret_key,
-            secure=secure
+            secure=secure,
+            http_client=http_client
         )
         logger.info(f"初始化Minio连接: endpoint={endpoint}")
         
@@ -67,15 +138,17 @@ class MinioConnection:
                 # 继续尝试其他bucket，不中断初始化
                 continue
 
-    def upload_file_by_path(self, object_name: str, bucket_name:str, file_path: str) -> bool:
+    def upload_file_by_path(self, object_name: str, bucket_name:str, file_path: str,
+                            content_type: str = "application/octet-stream") -> bool:
         """
-        通过文件路径上传文件到OSS成为一个文件
+        通过文件路径上传文件到OSS成为一个文件，从磁盘流式读取，不会整体读入内存
         """
         try:
             self.client.fput_object(
                 bucket_name=bucket_name,
                 object_name=object_name,
-                file_path=file_path
+                file_path=file_path,
+                content_type=content_type
             )
             logger.info(f"文件上传成功: bucket:{bucket_name};object_name:{object_name};file_path:{file_path}")
             return True
@@ -86,23 +159,25 @@ class MinioConnection:
     def upload_file_by_bytes(self,
         object_name: str, 
         bucket_name: str, 
-        file_bytes: bytes,
+        file_bytes: bytes | bytearray | memoryview,
         content_type: str) -> bool:
         try:
             """
             上传文件字节流到OSS成为一个文件
+            bytes 直接交给 BytesIO（CPython 对 bytes 不复制缓冲区）；bytearray / memoryview 按字节视图计算长度
             """
-            # 确保 file_bytes 是 bytes 类型
-            if isinstance(file_bytes, str):
-                file_bytes = file_bytes.encode('utf-8')
-            elif not isinstance(file_bytes, bytes):
-                raise ValueError(f"file_bytes 必须是 bytes 或 str 类型，当前类型: {type(file_bytes)}")
-            
+            # 文本需由调用方自行编码，这里只接受字节类型
+            if not isinstance(file_bytes, (bytes, bytearray, memoryview)):
+                raise ValueError(f"file_bytes 必须是 bytes、bytearray 或 memoryview 类型，当前类型: {type(file_bytes)}")
+            if not isinstance(file_bytes, bytes):
+                file_bytes = memoryview(file_bytes).cast("B")
+
             self.client.put_object(
                 bucket_name=bucket_name,
                 object_name=object_name,
                 data=io.BytesIO(file_bytes),
                 length=len(file_bytes),
+                part_size=UPLOAD_PART_SIZE,
                 content_type=content_type
             )
             logger.info(f"文件上传成功: bucket:{bucket_name};object_name:{object_name}")
@@ -111,6 +186,47 @@ class MinioConnection:
             logger.error(f"文件上传失败: bucket:{bucket_name};object_name:{object_name}, 异常：{e}")
             return False
 
+    def upload_file_by_stream(self,
+        object_name: str,
+        bucket_name: str,
+        stream,
+        content_type: str,
+        length: int = -1) -> bool:
+        """
+        上传文件对象（如 GeneratorStream、UploadFile.file）到OSS，按分片边读边传，不在内存中保留完整内容
+        长度未知时 length 传 -1
+        """
+        try:
+            self.client.put_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                data=stream,
+                length=length,
+                part_size=STREAM_PART_SIZE,
+                content_type=content_type
+            )
+            logger.info(f"文件上传成功: bucket:{bucket_name};object_name:{object_name}")
+            return True
+        except Exception as e:
+            logger.error(f"文件上传失败: bucket:{bucket_name};object_name:{object_name}, 异常：{e}")
+            return False
+
+    def copy_file(self, bucket_name: str, source_object: str, object_name: str) -> bool:
+        """
+        在同一存储桶内服务端复制对象，数据不经过本服务
+        """
+        try:
+            self.client.copy_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                source=CopySource(bucket_name, source_object)
+            )
+            logger.info(f"文件复制成功: bucket:{bucket_name};{source_object} -> {object_name}")
+            return True
+        except Exception as e:
+            logger.error(f"文件复制失败: bucket:{bucket_name};{source_object} -> {object_name}, 异常：{e}")
+            return False
+
     def download_file(self, object_name: str, bucket_name:str, file_path: str) -> bool:
         """
         下载文件到file_path（调用者指定一个文件路径）
@@ -149,17 +265,74 @@ class MinioConnection:
 
     def get_file_byte(self,object_name: str,bucket_name:str) -> bytes:
         """
-        获取文件的字节流
+        获取文件的字节流，读取完毕后立即归还连接到连接池
+        """
+        response = None
+        try:
+            response = self.client.get_object(
+                bucket_name=bucket_name,
+                object_name=object_name
+            )
+            return response.read(decode_content=True)
+        except Exception as e:
+            logger.error(f'获取文件失败: {object_name}, 异常: {e}')
+            raise RuntimeError(f'获取文件失败: {e}') from e
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    def stream_to_file(self, bucket_name: str, object_name: str, fileobj, hasher=None) -> None:
+        """
+        将对象内容按块流式写入文件对象，不在内存中保留完整的文件字节
+        传入 hasher（如 hashlib.blake2b()）时，在同一次读取中顺带计算内容摘要
         """
+        response = None
         try:
             response = self.client.get_object(
                 bucket_name=bucket_name,
                 object_name=object_name
             )
-            return response.read()
+            if hasher is None:
+                shutil.copyfileobj(response, fileobj, length=1 << 20)
+            else:
+                for chunk in response.stream(1 << 20):
+                    hasher.update(chunk)
+                    fileobj.write(chunk)
         except Exception as e:
-            logger.error(f'获取文件失败: {object_name}')
-            raise(f'获取文件失败: {e}')
+            logger.error(f'获取文件失败: {object_name}, 异常: {e}')
+            raise
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    def get_file_stream(self, bucket_name: str, object_name: str):
+        """
+        打开对象并返回未读取的响应（urllib3 HTTPResponse），由调用方按块读取
+        使用完毕后调用方必须执行 close() 与 release_conn() 归还连接
+        """
+        return self.client.get_object(
+            bucket_name=bucket_name,
+            object_name=object_name
+        )
+
+    @staticmethod
+    def iter_response(response, chunk_size: int = 1 << 20):
+        """
+        按块迭代 get_file_stream 返回的响应，迭代结束或中断时释放连接
+        """
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def iter_object(self, bucket_name: str, object_name: str, chunk_size: int = 1 << 20):
+        """
+        按块迭代对象内容，可直接交给 StreamingResponse，迭代结束或中断时释放连接
+        """
+        return self.iter_response(self.get_file_stream(bucket_name, object_name), chunk_size)
 
     def file_exists(self,object_name: str,bucket_name:str) -> bool:
         """
@@ -174,6 +347,34 @@ class MinioConnection:
             logger.error(f"文件不存在: {e}, object_name: {object_name}, bucket_name: {bucket_name}")
             raise HTTPException(status_code=404, detail=f"文件不存在: {e}")
     
+    def object_exists(self, bucket_name: str, object_name: str) -> bool:
+        """
+        通过列举判断对象是否存在：以对象名为前缀非递归列举，只读取首个结果
+        同前缀的键按字典序排列，对象本身若存在必然排在第一个，因此只需请求一页
+        与 file_exists 不同，列举失败时按不存在处理，不抛出异常
+        """
+        first = next(self.iter_objects(bucket_name, prefix=object_name, recursive=False), None)
+        return first == object_name
+
+    def existing_objects(self, bucket_name: str, object_names: Iterable[str]) -> set:
+        """
+        批量检查对象是否存在：按对象所在目录各列举一次，代替逐个 stat_object 的往返
+        列举失败时抛出异常（S3Error 或连接错误），不会把存储故障当作对象不存在
+        :param bucket_name: 存储桶名称
+        :param object_names: 待检查的对象名称
+        :return: 其中存在的对象名称集合
+        """
+        names = set(object_names)
+        prefixes = set()
+        for name in names:
+            # 前缀末尾的 / 不可省略，否则会匹配到同名前缀的其他目录
+            directory = posixpath.dirname(name)
+            prefixes.add(f"{directory}/" if directory else "")
+        existing = set()
+        for prefix in prefixes:
+            existing.update(self._iter_object_names(bucket_name, prefix=prefix, recursive=False))
+        return existing & names
+
     def bucket_exists(self, bucket_name: str) -> bool:
         """
         检查存储桶是否存在
@@ -186,6 +387,26 @@ class MinioConnection:
             logger.error(f"检查存储桶失败: {bucket_name}, 异常: {e}")
             return False
 
+    def _iter_object_names(self, bucket_name: str, prefix: str = "", recursive: bool = True) -> Iterator[str]:
+        """
+        逐个产出对象名称，列举出错时直接抛出异常
+        """
+        for obj in self.client.list_objects(bucket_name, prefix=prefix, recursive=recursive, use_api_v1=False):
+            yield obj.object_name
+
+    def iter_objects(self, bucket_name: str, prefix: str = "", recursive: bool = True) -> Iterator[str]:
+        """
+        逐个产出存储桶中的对象名称，按分页惰性请求，不在内存中保留完整列表
+        列举出错时记录日志并结束迭代
+        :param bucket_name: 存储桶名称
+        :param prefix: 对象前缀过滤
+        :param recursive: 是否递归搜索
+        """
+        try:
+            yield from self._iter_object_names(bucket_name, prefix=prefix, recursive=recursive)
+        except Exception as e:
+            logger.error(f"列出对象失败: bucket={bucket_name}, prefix={prefix}, 异常: {e}")
+
     def list_objects(self, bucket_name: str, prefix: str = "", recursive: bool = True) -> list:
         """
         列出存储桶中的对象，支持前缀过滤
@@ -194,12 +415,67 @@ class MinioConnection:
         :param recursive: 是否递归搜索
         :return: 对象名称列表
         """
+        return list(self.iter_objects(bucket_name, prefix=prefix, recursive=recursive))
+
+    def list_objects_concurrent(self, bucket_name: str, prefix: str = "") -> list:
+        """
+        递归列出前缀下的所有对象：先非递归列出一层，再并发递归列出各子目录
+        各子目录的分页请求相互重叠，适合子目录较多的大目录
+        :param bucket_name: 存储桶名称
+        :param prefix: 对象前缀过滤
+        :return: 按名称排序的对象名称列表，与 list_objects(recursive=True) 结果一致
+        """
+        top_level = self.list_objects(bucket_name, prefix=prefix, recursive=False)
+        objects = [name for name in top_level if not name.endswith("/")]
+        sub_prefixes = [name for name in top_level if name.endswith("/")]
+        if not sub_prefixes:
+            return objects
+        with ThreadPoolExecutor(max_workers=min(MINIO_LIST_WORKERS, len(sub_prefixes))) as pool:
+            for names in pool.map(lambda sub_prefix: self.list_objects(bucket_name, prefix=sub_prefix, recursive=True), sub_prefixes):
+                objects.extend(names)
+        objects.sort()
+        return objects
+
+    def _list_objects_range(self, bucket_name: str, prefix: str, start_after, stop_at) -> list:
+        """
+        递归列出前缀下键位于 (start_after, stop_at] 区间的对象，None 表示该侧不设边界
+        """
+        names = []
         try:
-            objects = self.client.list_objects(bucket_name, prefix=prefix, recursive=recursive)
-            return [obj.object_name for obj in objects]
+            objects = self.client.list_objects(
+                bucket_name, prefix=prefix, recursive=True, use_api_v1=False, start_after=start_after
+            )
+            for obj in objects:
+                if stop_at is not None and obj.object_name > stop_at:
+                    # 结果按键有序，越过上界即可停止，不再请求后续分页
+                    break
+                names.append(obj.object_name)
         except Exception as e:
-            logger.error(f"列出对象失败: bucket={bucket_name}, prefix={prefix}, 异常: {e}")
-            return []
+            logger.error(f"列出对象失败: bucket={bucket_name}, prefix={prefix}, start_after={start_after}, 异常: {e}")
+        return names
+
+    def list_objects_parallel(self, bucket_name: str, prefix: str = "", shards: int = MINIO_LIST_WORKERS) -> list:
+        """
+        按键范围分片并发递归列出对象，适合前缀很短、对象数量巨大的场景
+        用 LIST_SHARD_ALPHABET 中均匀选取的字符作为分界点，每个分片通过 start_after 从分界点开始列举，
+        到下一个分界点为止；分片首尾不设边界，因此任意键都恰好落在一个分片内
+        :param bucket_name: 存储桶名称
+        :param prefix: 对象前缀过滤
+        :param shards: 分片数（即并发列举数）
+        :return: 按名称排序的对象名称列表，与 list_objects(recursive=True) 结果一致
+        """
+        shards = max(1, min(shards, len(LIST_SHARD_ALPHABET)))
+        step = len(LIST_SHARD_ALPHABET) / shards
+        bounds = [None] + [prefix + LIST_SHARD_ALPHABET[int(i * step)] for i in range(1, shards)] + [None]
+        objects = []
+        with ThreadPoolExecutor(max_workers=shards) as pool:
+            ranges = pool.map(
+                lambda i: self._list_objects_range(bucket_name, prefix, bounds[i], bounds[i + 1]),
+                range(shards)
+            )
+            for names in ranges:
+                objects.extend(names)
+        return objects
 
     def find_files_by_pattern(self, bucket_name: str, pattern: str) -> list:
         """
@@ -209,14 +485,22 @@ class MinioConnection:
         :return: 匹配的文件路径列表
         """
         import fnmatch
-        
-        # 提取前缀用于优化搜索
-        if "*" in pattern:
-            prefix = pattern.split("*")[0]
+        import re
+
+        # 提取第一个通配符之前的字面前缀用于缩小列举范围
+        prefix = re.split(r"[*?\[]", pattern, maxsplit=1)[0]
+
+        if pattern.count("*") == 1 and not any(c in pattern for c in "?["):
+            # 最常见的 前缀*后缀 形式（如 "{task_id}/*middle.json"）直接比较首尾，不经过正则
+            head, tail = pattern.split("*")
+            min_len = len(head) + len(tail)
+            matches = lambda name: len(name) >= min_len and name.startswith(head) and name.endswith(tail)
         else:
-            prefix = ""
-        
-        all_objects = self.list_objects(bucket_name, prefix=prefix)
-        matching_files = fnmatch.filter(all_objects, pattern)
-        
-        return matching_files
+            matches = re.compile(fnmatch.translate(pattern)).match
+
+        if len(prefix) < LIST_SHARD_PREFIX_LEN:
+            all_objects = self.list_objects_parallel(bucket_name, prefix=prefix)
+        else:
+            # 边列举边过滤，不保留完整的对象列表
+            all_objects = self.iter_objects(bucket_name, prefix=prefix)
+        return [name for name in all_objects if matches(name)]
@@ -2,8 +2,13 @@
 import os
 import threading
 from concurrent.futures import ThreadPoolExecutor, Future
+from itertools import chain, repeat
 from typing import Callable, Any
 
+
+def _run_chunk(func: Callable[..., Any], chunk: list) -> list:
+    return [func(item) for item in chunk]
+
 class _SingletonMeta(type):
     _instance = None
     _lock = threading.Lock()
@@ -15,13 +20,21 @@ class _SingletonMeta(type):
                     cls._instance = super().__call__(*args, **kwargs)
         return cls._instance
 
+# 线程池大小，可通过 JUMO_MAX_WORKERS 覆盖
+MAX_WORKERS = int(os.getenv("JUMO_MAX_WORKERS", str(max(1, min(os.cpu_count() // 2, 8)))))
+
 class ThreadPoolSingleton(metaclass=_SingletonMeta):
+    """
+    进程内共享的线程池
+    任务中调用 NumPy/OpenCV 等自带 OpenMP/MKL 线程池的库时，注意 线程数 × OMP 线程数 不要超订 CPU，
+    OMP_NUM_THREADS 等变量需在这些库导入前设置，由进程入口（jumo_service、pdf_process_worker）负责
+    """
     def __init__(self, max_workers: int | None = None):
         if not hasattr(self, "_initialized"):
             self._initialized = False
         if not self._initialized:
-            # 线程数量不要太多，最多8个
-            self._max_workers = max_workers or min(os.cpu_count()//2, 8)
+            # 线程数量不要太多，默认最多8个
+            self._max_workers = max_workers or MAX_WORKERS
             self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
             self._initialized = True
             self._shutdown_lock = threading.Lock()
@@ -29,8 +42,19 @@ class ThreadPoolSingleton(metaclass=_SingletonMeta):
     def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
         return self._executor.submit(func, *args, **kwargs)
 
-    def map(self, func: Callable[..., Any], iterable, chunksize: int = 1):
-        return self._executor.map(func, iterable, chunksize=chunksize)
+    def map(self, func: Callable[..., Any], iterable, chunksize: int | None = None):
+        """
+        与 Executor.map 相同，结果按输入顺序惰性返回
+        ThreadPoolExecutor 会忽略 chunksize，这里自行分块：每块作为一个任务提交，减少细粒度任务的排队开销
+        chunksize 默认按 每个线程约 4 块 计算
+        """
+        items = list(iterable)
+        if chunksize is None:
+            chunksize = max(1, len(items) // (self._max_workers * 4))
+        if chunksize <= 1:
+            return self._executor.map(func, items)
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        return chain.from_iterable(self._executor.map(_run_chunk, repeat(func), chunks))
 
     def shutdown(self, wait: bool = True):
         with self._shutdown_lock:
@@ -1,79 +1,117 @@
-import copy
-from os import cpu_count
+import os
+from functools import partial
 import numpy as np
 from utils.workers_threading_pool import ThreadPoolSingleton
-from mineru.utils.ocr_utils import OcrConfidence, calculate_is_angle,get_rotate_crop_image
+from utils.geom_kernels import is_angle_batch
+from mineru.utils.ocr_utils import OcrConfidence, get_rotate_crop_image
 
-CONCURRENCY = min(cpu_count()//2, 16)
-def get_ocr_result_list_parallel(ocr_res, useful_list, ocr_enable, new_image, lang, max_workers=8) ->list:
-    ori_im = new_image.copy()
-    # 按 batch_size 划分参数列表
-    params = []
-    batch_size = max(1, len(ocr_res) // CONCURRENCY)
-    for i in range(0, len(ocr_res), batch_size):
-        batch_ocr = ocr_res[i:i+batch_size]
-        params.append((batch_ocr, useful_list, ocr_enable, ori_im, lang))
-    results = []
-    futures = [ThreadPoolSingleton().submit(process_batch, *arg) for arg in params]
-    for fut in futures:
-        res = fut.result()
-        if res:
-            results.extend(res)
-    return results
+# 裁剪任务的分批数，可通过 JUMO_MAX_WORKERS 覆盖
+CONCURRENCY = int(os.getenv("JUMO_MAX_WORKERS", str(max(1, min(os.cpu_count() // 2, 16)))))
+# 裁剪文本框所在区域时四周保留的像素数：透视变换用三次插值，采样会用到四边形外 2 个像素
+CROP_MARGIN = 3
+# 裁剪任务少于该数量时直接在当前线程执行，省去线程池分发与等待的开销
+INLINE_CROP_THRESHOLD = int(os.getenv("OCR_INLINE_CROP_THRESHOLD", "32"))
+# 角度校正后矩形四个角点相对中心的方向（左上、右上、右下、左下）
+_RECT_CORNER_SIGNS = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float64)
 
-def process_batch(batch_ocr, useful_list, ocr_enable, ori_im, lang)->list[dict]:
-    res_list = []
-    for box_ocr_res in batch_ocr:
-        res = process_box(box_ocr_res, useful_list, ocr_enable, ori_im, lang)
-        if res:
-            res_list.append(res)
-    return res_list
-
-def process_box(box_ocr_res, useful_list, ocr_enable, ori_im, lang)->dict|None:
-    # 解包
+def get_ocr_result_list_parallel(ocr_res, useful_list, ocr_enable, new_image, lang, max_workers=8) ->list:
+    if len(ocr_res) == 0:
+        return []
     paste_x, paste_y, xmin, ymin, xmax, ymax, _, _ = useful_list
-    # 早期过滤
-    if len(box_ocr_res) == 2:
-        coords, (text, score) = box_ocr_res
-        if score < OcrConfidence.min_confidence:
-            return None
-    else:
-        coords = box_ocr_res
-        text, score = "", 1
 
-    p1, p2, p3, p4 = coords[0], coords[1], coords[2], coords[3]
-    if (p3[0] - p1[0]) < OcrConfidence.min_width:
-        return None
+    # 识别结果为 (coords, (text, score))，仅检测时为 coords
+    has_text = []
+    texts = []
+    scores = []
+    coords_list = []
+    for box_ocr_res in ocr_res:
+        if len(box_ocr_res) == 2:
+            coords, (text, score) = box_ocr_res
+            has_text.append(True)
+        else:
+            coords, text, score = box_ocr_res, "", 1
+            has_text.append(False)
+        coords_list.append(coords[:4])
+        texts.append(text)
+        scores.append(score)
 
-    # 角度校正
-    poly = [p1, p2, p3, p4]
-    if calculate_is_angle(poly):
-        # 重新计算 p1-p4 坐标
-        x_center = sum(pt[0] for pt in poly)/4
-        y_center = sum(pt[1] for pt in poly)/4
-        new_h = ((p4[1] - p1[1]) + (p3[1] - p2[1])) / 2
-        new_w = p3[0] - p1[0]
-        p1 = [x_center - new_w/2, y_center - new_h/2]
-        p2 = [x_center + new_w/2, y_center - new_h/2]
-        p3 = [x_center + new_w/2, y_center + new_h/2]
-        p4 = [x_center - new_w/2, y_center + new_h/2]
+    # 所有文本框一次性堆叠为 (N, 4, 2)，过滤、角度校正、坐标平移都在 NumPy 中批量完成
+    polys = np.array(coords_list, dtype=np.float64)
+    keep = (np.array(scores, dtype=np.float64) >= OcrConfidence.min_confidence) \
+        & ((polys[:, 2, 0] - polys[:, 0, 0]) >= OcrConfidence.min_width)
+    # 转换回原图坐标（先减粘贴偏移再加裁剪起点，与逐点计算的顺序一致）
+    adjusted = correct_angle_polys(polys) - np.array([paste_x, paste_y]) + np.array([xmin, ymin])
+    adjusted_list = adjusted.reshape(len(ocr_res), 8).tolist()
 
-    # 转换回原图坐标
-    def adjust(pt):
-        return [pt[0] - paste_x + xmin, pt[1] - paste_y + ymin]
-    p1, p2, p3, p4 = adjust(p1), adjust(p2), adjust(p3), adjust(p4)
-
-    result = {
-        'category_id': 15,
-        'poly': p1 + p2 + p3 + p4,
-        'score': float(round(score, 2)),
-        'text': text,
-        'lang': lang
-    }
+    results = []
+    # 需要裁剪的结果与其坐标分两个列表存放，直接作为线程池 map 的输入，不再逐个组装元组
+    crop_results = []
+    crop_points = []
+    for i in np.flatnonzero(keep).tolist():
+        result = {
+            'category_id': 15,
+            'poly': adjusted_list[i],
+            'score': float(round(scores[i], 2)),
+            'text': texts[i],
+            'lang': lang
+        }
+        results.append(result)
+        if ocr_enable and not has_text[i]:
+            # 裁剪使用未校正的原始坐标
+            crop_results.append(result)
+            crop_points.append(polys[i])
 
-    if ocr_enable and len(box_ocr_res) != 2:
-        tmp_pt = copy.deepcopy(np.array([coords[0], coords[1], coords[2], coords[3]]).astype('float32'))
-        img_crop = get_rotate_crop_image(ori_im, tmp_pt)
+    # 只有透视裁剪需要放到线程池中，分块由线程池的 map 完成；任务很少时直接串行执行
+    # 原图只绑定一次，每个任务只传入各自的坐标
+    crop = partial(process_box, ori_im=new_image)
+    if len(crop_points) < INLINE_CROP_THRESHOLD:
+        crops = map(crop, crop_points)
+    else:
+        crops = ThreadPoolSingleton().map(
+            crop,
+            crop_points,
+            chunksize=max(1, len(crop_points) // CONCURRENCY)
+        )
+    for result, img_crop in zip(crop_results, crops, strict=True):
         result['np_img'] = img_crop
+    return results
+
+def correct_angle_polys(polys: np.ndarray) -> np.ndarray:
+    """
+    批量角度校正：倾斜的文本框替换为以四点中心为中心、宽取 p3.x - p1.x、高取左右两边平均高度的水平矩形
+    倾斜判定见 utils.geom_kernels.is_angle_batch
+    :param polys: (N, 4, 2) 的四点坐标
+    :return: 校正后的 (N, 4, 2) 坐标，未倾斜的文本框保持不变
+    """
+    is_angle = is_angle_batch(polys)
+    if not is_angle.any():
+        return polys
+    p1, p2, p3, p4 = polys[:, 0], polys[:, 1], polys[:, 2], polys[:, 3]
+    height = ((p4[:, 1] - p1[:, 1]) + (p3[:, 1] - p2[:, 1])) / 2
+    center = polys.sum(axis=1) / 4
+    half_size = np.stack([p3[:, 0] - p1[:, 0], height], axis=1) / 2
+    rect = center[:, None, :] + _RECT_CORNER_SIGNS * half_size[:, None, :]
+    return np.where(is_angle[:, None, None], rect, polys)
+
+def crop_box_region(image: np.ndarray, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    取文本框外接矩形（含 CROP_MARGIN 边距）的切片视图，并把四点坐标平移到切片坐标系
+    切片不复制像素，透视变换只在这一小块上采样，结果与在整图上一致
+    """
+    h, w = image.shape[:2]
+    x0 = max(int(np.floor(points[:, 0].min())) - CROP_MARGIN, 0)
+    y0 = max(int(np.floor(points[:, 1].min())) - CROP_MARGIN, 0)
+    x1 = min(int(np.ceil(points[:, 0].max())) + CROP_MARGIN + 1, w)
+    y1 = min(int(np.ceil(points[:, 1].max())) + CROP_MARGIN + 1, h)
+    if x0 >= x1 or y0 >= y1:
+        # 文本框落在图像外，交给原逻辑处理
+        return image, points
+    return image[y0:y1, x0:x1], points - np.array([x0, y0], dtype=np.float32)
 
-    return result
\ No newline at end of file
+def process_box(points: np.ndarray, ori_im: np.ndarray) -> np.ndarray:
+    """
+    按文本框四点从原图中透视裁剪出文本图像
+    """
+    # get_rotate_crop_image 需要 C 连续的 float32 坐标；已满足时 ascontiguousarray 不复制
+    tmp_pt = np.ascontiguousarray(points, dtype=np.float32)
+    return get_rotate_crop_image(*crop_box_region(ori_im, tmp_pt))
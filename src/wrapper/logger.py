@@ -1,18 +1,60 @@
 from functools import wraps
 from loguru import logger
+import reprlib
 import time
 
+
+class _ArgRepr(reprlib.Repr):
+    """
+    日志中参数与返回值的简要表示：数组、图像、字节串只记录形状/尺寸/长度，不展开内容，
+    其余对象按 reprlib 规则截断，避免对大对象做完整的 repr
+    """
+    def __init__(self):
+        super().__init__()
+        self.maxstring = 200
+        self.maxother = 200
+
+    def repr_ndarray(self, obj, level):
+        return f"<ndarray shape={obj.shape} dtype={obj.dtype}>"
+
+    def repr_bytes(self, obj, level):
+        return f"<bytes len={len(obj)}>"
+
+    def repr_bytearray(self, obj, level):
+        return f"<bytearray len={len(obj)}>"
+
+    def repr_instance(self, obj, level):
+        # PIL 图像的具体类名随格式变化（PngImageFile 等），按属性识别
+        if hasattr(obj, "size") and hasattr(obj, "mode") and hasattr(obj, "getbands"):
+            return f"<Image size={obj.size} mode={obj.mode}>"
+        return super().repr_instance(obj, level)
+
+
+_arg_repr = _ArgRepr()
+
+
+def _summarize(value) -> str:
+    return _arg_repr.repr(value)
+
+
 def log_with_time_consumption(level="INFO"):
-    """记录调用、返回、耗时、异常"""
+    """记录调用、返回、耗时、异常（参数与返回值只在该级别日志会被输出时才格式化）"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            logger.log(level, f"调用 {func.__name__},参数：args={args},kwargs={kwargs}")
-            start_time = time.time()
+            logger.opt(lazy=True).log(
+                level, "调用 {},参数：args={},kwargs={}",
+                lambda: func.__name__, lambda: _summarize(args), lambda: _summarize(kwargs)
+            )
+            # 单调计时器，不受系统时间调整影响
+            start_ns = time.perf_counter_ns()
             try:
                 result = func(*args, **kwargs)
-                duration = time.time() - start_time
-                logger.log(level, f"{func.__name__} 返回：{result}，耗时：{duration:.3f}s")
+                duration_ns = time.perf_counter_ns() - start_ns
+                logger.opt(lazy=True).log(
+                    level, "{} 返回：{}，耗时：{:.3f}s",
+                    lambda: func.__name__, lambda: _summarize(result), lambda: duration_ns / 1e9
+                )
                 return result
             except Exception as e:
                 logger.exception(f"{func.__name__} 执行异常：{e}")
@@ -22,14 +64,20 @@ def log_with_time_consumption(level="INFO"):
 
 
 def log_function_call(level="INFO"):
-    """记录调用、返回、异常"""
+    """记录调用、返回、异常（参数与返回值只在该级别日志会被输出时才格式化）"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            logger.log(level, f"调用 {func.__name__}，参数：args={args}, kwargs={kwargs}")
+            logger.opt(lazy=True).log(
+                level, "调用 {}，参数：args={}, kwargs={}",
+                lambda: func.__name__, lambda: _summarize(args), lambda: _summarize(kwargs)
+            )
             try:
                 result = func(*args, **kwargs)
-                logger.log(level, f"{func.__name__} 返回：{result}")
+                logger.opt(lazy=True).log(
+                    level, "{} 返回：{}",
+                    lambda: func.__name__, lambda: _summarize(result)
+                )
                 return result
             except Exception as e:
                 logger.exception(f"{func.__name__} 执行异常：{e}")
@@ -37,4 +85,3 @@ def log_function_call(level="INFO"):
         return wrapper
     return decorator
 
-
@@ -22,6 +22,15 @@ def safe_merge_2_list_blocks(block1, block2):
     
     return block1, block2
 
+def _normalize_block(block):
+    """
+    补齐 block 中缺失的 lines / spans / content 字段
+    不在 block 上写入额外的标记字段，避免其随结果一起输出到 middle.json
+    """
+    for line in block.setdefault('lines', []):
+        for span in line.setdefault('spans', []):
+            span.setdefault('content', '')  # 或根据 span['type'] 设置默认值
+
 def safe_merge_2_text_blocks(block1, block2):
     """
     修复 content 缺失问题的合并函数
@@ -29,13 +38,8 @@ def safe_merge_2_text_blocks(block1, block2):
     而不是放任其为空值
     """
     # 确保 blocks 和 spans 结构完整
-    for block in [block1, block2]:
-        block.setdefault('lines', [])
-        for line in block['lines']:
-            line.setdefault('spans', [])
-            for span in line['spans']:
-                if 'content' not in span:
-                    span['content'] = ''  # 或根据 span['type'] 设置默认值
+    _normalize_block(block1)
+    _normalize_block(block2)
     
     # 调用原始合并逻辑
     return original_merge(block1, block2)
\ No newline at end of file
@@ -1,16 +1,28 @@
 from concurrent.futures import ProcessPoolExecutor
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterable, Iterator, Tuple
+from collections import deque, OrderedDict
 import pypdfium2 as pdfium
 from mineru.utils.pdf_image_tools import pdf_page_to_image
 from mineru.utils.enum_class import ImageType
 import multiprocessing as mp
 import threading
+import hashlib
+import heapq
 import os 
 import tempfile
 from loguru import logger
 
 # 设置并行度，太多进程也不好
 CONCURRENCY = min(mp.cpu_count()//4, 8)
+# 临时 PDF 的存放目录，默认为系统临时目录
+# 内存文件系统容量充足时（容器中 /dev/shm 默认只有 64 MiB）可设置 PDF_TEMP_DIR=/dev/shm，各工作进程打开文件时不经过磁盘
+PDF_TEMP_DIR = os.getenv("PDF_TEMP_DIR") or tempfile.gettempdir()
+# 流式渲染时每个任务包含的连续页数
+RENDER_CHUNK_PAGES = int(os.getenv("RENDER_CHUNK_PAGES", "4"))
+# 每个工作进程缓存的 PdfDocument 数量上限
+PDF_DOC_CACHE_SIZE = int(os.getenv("PDF_DOC_CACHE_SIZE", "4"))
+# 每个工作进程缓存的 PDF 文件总字节数上限（默认 64 MiB）
+PDF_DOC_CACHE_BYTES = int(os.getenv("PDF_DOC_CACHE_BYTES", str(64 * 1024 * 1024)))
 
 # 全局进程池管理器
 class GlobalProcessPool:
@@ -40,52 +52,158 @@ class GlobalProcessPool:
         if hasattr(self, 'executor'):
             self.executor.shutdown(wait=True)
 
-# 处理PDF
-def render_page_batch(pdf_path:str,page_index: int, pages:int, dpi: int) -> List[Dict]:
-    logger.info(f"process: {os.getpid()} is processing from page_index:{page_index} for pages:{pages} dpi:{dpi}")
+# 工作进程内按 LRU 缓存的 PdfDocument（fork 出的每个进程各有一份）
+# 键为 PDF 内容的摘要而不是路径：每次调用都会写新的临时文件，按路径缓存在调用之间不会命中，
+# 按内容缓存则同一 PDF 的多次渲染（分段加载、重试）可以跳过解析
+# 临时文件在调用结束时即被删除，但已打开的文档仍持有它，位于 /dev/shm 时占用的内存直到文档被淘汰关闭才释放，
+# 因此除数量外还按文件大小限制缓存总量；刚打开的文档即使单独超过上限也保留（同一调用的其他页组还要用），
+# 下一个文档打开时被淘汰
+# 工作进程由进程池以 os._exit 结束，不会执行 atexit，缓存的文档随进程退出由系统回收
+_worker_pdf_docs: "OrderedDict[str, Tuple[pdfium.PdfDocument, int]]" = OrderedDict()
+_worker_pdf_bytes = 0
+
+def _get_worker_pdf(pdf_path: str, doc_key: str) -> pdfium.PdfDocument:
+    global _worker_pdf_bytes
+    cached = _worker_pdf_docs.get(doc_key)
+    if cached is not None:
+        _worker_pdf_docs.move_to_end(doc_key)
+        return cached[0]
+    size = os.path.getsize(pdf_path)
     pdf_doc = pdfium.PdfDocument(pdf_path)
+    _worker_pdf_docs[doc_key] = (pdf_doc, size)
+    _worker_pdf_bytes += size
+    while len(_worker_pdf_docs) > 1 and (
+        len(_worker_pdf_docs) > PDF_DOC_CACHE_SIZE or _worker_pdf_bytes > PDF_DOC_CACHE_BYTES
+    ):
+        _, (evicted, evicted_size) = _worker_pdf_docs.popitem(last=False)
+        evicted.close()
+        _worker_pdf_bytes -= evicted_size
+    return pdf_doc
+
+# 处理PDF
+def render_page_batch(pdf_path:str, page_indices: List[int], dpi: int, doc_key: str = None) -> List[Dict]:
+    logger.info(f"process: {os.getpid()} is processing {len(page_indices)} pages from page_index:{page_indices[0]} dpi:{dpi}")
+    pdf_doc = _get_worker_pdf(pdf_path, doc_key or pdf_path)
+    # 进程内逐页串行渲染：PDFium 不是线程安全的（pypdfium2 明确要求同一进程内不得并发调用，
+    # 即使是不同页面或不同文档），ctypes 调用期间又会释放 GIL，线程并发渲染可能导致崩溃。
+    # 并行度由进程池提供，增加并行请调整 CONCURRENCY
+    # 渲染出的 PIL 图像会在任务返回时序列化传回主进程，工作进程中无法复用其缓冲区，因此不做图像缓冲池
     all_pages = []
-    for i in range(page_index, page_index + pages):
+    for i in page_indices:
         page = pdf_doc[i]
         all_pages.append(pdf_page_to_image(page, dpi=dpi, image_type=ImageType.PIL))
-    pdf_doc.close()  # 确保关闭文档
     return all_pages
 
+# 按页面面积把页面分配到各个任务中，使每个任务的渲染量大致相同
+def partition_pages_by_area(pdf_doc: pdfium.PdfDocument, start_page_id: int, end_page_id: int, bins: int) -> List[List[int]]:
+    """
+    渲染耗时与目标 DPI 下的像素数成正比，用页面面积作为权重（get_page_size 不加载页面，开销很小）
+    按权重从大到小依次放入当前总权重最小的分组（LPT 贪心），每组内页号升序
+    """
+    pages = range(start_page_id, end_page_id + 1)
+    bins = max(1, min(bins, len(pages)))
+    weights = []
+    for i in pages:
+        width, height = pdf_doc.get_page_size(i)
+        weights.append((width * height, i))
+    weights.sort(reverse=True)
+    heap = [(0.0, b) for b in range(bins)]
+    groups: List[List[int]] = [[] for _ in range(bins)]
+    for weight, i in weights:
+        load, b = heapq.heappop(heap)
+        groups[b].append(i)
+        heapq.heappush(heap, (load + weight, b))
+    return [sorted(group) for group in groups if group]
+
+# PDF 内容的摘要，作为工作进程中文档缓存的键
+def pdf_doc_key(pdf_bytes: bytes) -> str:
+    return hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+
 # 把pdf放入临时文件中
 def write_temp_pdf(pdf_bytes: bytes) -> str:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=PDF_TEMP_DIR) as tmp_file:
         tmp_file.write(pdf_bytes)
         pdf_path = tmp_file.name
     return pdf_path
 
+# 渲染调度：按顺序把页组提交到进程池，最多同时在途 max_inflight 个任务，前面的任务取走后再提交新的任务
+# load_images_from_pdf 与 iter_images_from_pdf 共用这一个调度循环
+def _render_page_groups(pdf_path: str, doc_key: str, page_groups: Iterable[List[int]], dpi: int,
+                        max_inflight: int) -> Iterator[Tuple[int, object]]:
+    executor = GlobalProcessPool().get_executor()
+    page_groups = iter(page_groups)
+    pending = deque()
+
+    def submit_next() -> None:
+        group = next(page_groups, None)
+        if group is not None:
+            pending.append((group, executor.submit(render_page_batch, pdf_path, group, dpi, doc_key)))
+
+    try:
+        for _ in range(max(1, max_inflight)):
+            submit_next()
+        while pending:
+            group, future = pending.popleft()
+            images = future.result()
+            submit_next()
+            yield from zip(group, images, strict=True)
+    finally:
+        # 调用方提前结束迭代或渲染出错时，取消尚未开始的任务
+        for _, future in pending:
+            future.cancel()
+
 # 使用全局进程池
 def load_images_from_pdf(pdf_bytes, start_page_id=0, end_page_id=None, dpi=200, image_type = ImageType.PIL):
+    # 主进程直接从内存中的字节打开文档，返回给调用方的 pdf_doc 不依赖随后被删除的临时文件
+    # 工作进程仍通过临时文件路径打开：进程池在此之前早已 fork，字节只能随任务序列化传递，
+    # 而路径位于内存文件系统时各进程读取同一份数据，不产生复制
+    pdf_doc = pdfium.PdfDocument(pdf_bytes)
     pdf_path = write_temp_pdf(pdf_bytes)
-    pdf_doc = pdfium.PdfDocument(pdf_path)
+    doc_key = pdf_doc_key(pdf_bytes)
     total_pages = len(pdf_doc)
     try:
         end_page_id = end_page_id if end_page_id is not None else total_pages - 1
         end_page_id = min(end_page_id, total_pages - 1)
-        step = max(1, (end_page_id - start_page_id + 1) // CONCURRENCY)
-        task_indices = []
-        for i in range(start_page_id, end_page_id + 1, step):
-            last_page = min(i + step, end_page_id + 1)
-            if not last_page > i:
-                raise ValueError(f"last_page({last_page}) must be greater than i({i})")
-            task_indices.append((i, last_page - i))
-        
-        executor = GlobalProcessPool().get_executor()
-        futures = [(i, executor.submit(render_page_batch, pdf_path, i, pages, dpi)) for i, pages in task_indices]
-        results = []
-        for start_page, future in futures:
-            results.append((start_page, future.result()))
-
-        results.sort(key=lambda x: x[0])  # 按页号排序
-        images_list = []
-        for start_page, batch in results:
-            images_list.extend(batch)
+        if end_page_id < start_page_id:
+            return [], pdf_doc
+        page_groups = partition_pages_by_area(pdf_doc, start_page_id, end_page_id, CONCURRENCY)
+        # 调用方需要完整的页面列表，所有页组一次性提交
+        # 各组页号不连续，按页号直接写入预分配的列表，不需要收集后再排序
+        images_list = [None] * (end_page_id - start_page_id + 1)
+        for i, image in _render_page_groups(pdf_path, doc_key, page_groups, dpi, len(page_groups)):
+            images_list[i - start_page_id] = image
         return images_list, pdf_doc
     except Exception as e:
         raise e
     finally:
         os.remove(pdf_path) # 释放文件资源
+
+# 流式渲染：按页号顺序逐页产出，内存中最多保留 max_inflight 个任务的页面
+def iter_images_from_pdf(pdf_bytes, start_page_id=0, end_page_id=None, dpi=200,
+                         chunk_pages=RENDER_CHUNK_PAGES, max_inflight=None) -> Iterator[Tuple[int, object]]:
+    """
+    与 load_images_from_pdf 渲染结果相同，但以 (页号, 图像) 的形式按页号顺序逐页产出
+    页面按连续的 chunk_pages 页划分为小任务，只有前面的页被取走后才提交新的任务，
+    因此驻留内存的页面数量为 O(max_inflight * chunk_pages)，与总页数无关
+    小任务由进程池动态调度，无需再按面积预先分组
+    :param max_inflight: 同时在途的任务数，默认为进程池工作进程数的 2 倍
+    """
+    pdf_path = write_temp_pdf(pdf_bytes)
+    doc_key = pdf_doc_key(pdf_bytes)
+    try:
+        pdf_doc = pdfium.PdfDocument(pdf_bytes)
+        try:
+            total_pages = len(pdf_doc)
+        finally:
+            pdf_doc.close()
+        end_page_id = end_page_id if end_page_id is not None else total_pages - 1
+        end_page_id = min(end_page_id, total_pages - 1)
+        chunk_pages = max(1, chunk_pages)
+        max_inflight = max_inflight or 2 * GlobalProcessPool().get_executor()._max_workers
+        chunks = (
+            list(range(i, min(i + chunk_pages, end_page_id + 1)))
+            for i in range(start_page_id, end_page_id + 1, chunk_pages)
+        )
+        yield from _render_page_groups(pdf_path, doc_key, chunks, dpi, max_inflight)
+    finally:
+        os.remove(pdf_path) # 释放文件资源